@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.HashingOverloadedMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -93,9 +95,147 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # seconds a connection is kept open for the next request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# With DB_POOL set, every process keeps up to DB_POOL_SIZE connections
+# that requests borrow and give back; a borrower waits DB_POOL_TIMEOUT
+# seconds for a free one, and connections idle for DB_POOL_CHECK_AFTER
+# seconds are tested before being handed out
+if bool(int(os.environ.get('DB_POOL', 0))):
+    DATABASES['default'].update({
+        'ENGINE': 'core.db.backends.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'CHECK_AFTER': float(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+        },
+    })
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+# recipe_lists holds the per user generations stamping cached lists and
+# etags, so it must be shared by every process; the process local
+# default is refused unless DEBUG is on
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipe_lists': {
+        'BACKEND': os.environ.get(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('RECIPE_CACHE_LOCATION', 'recipe-lists'),
+        'TIMEOUT': int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300)),
+    },
+}
+
+RECIPE_LIST_CACHE = 'recipe_lists'
+
+# Serialize list responses straight from .values() rows
+RECIPE_FAST_SERIALIZERS = bool(int(os.environ.get('RECIPE_FAST_SERIALIZERS', 1)))
+
+# Number of recipes read per round trip by the streaming export
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 500))
+
+# Uploaded images are re-encoded by a pool of background threads,
+# 0 processes them inside the request
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_FORMAT = os.environ.get('RECIPE_IMAGE_FORMAT', 'WEBP')
+RECIPE_IMAGE_QUALITY = int(os.environ.get('RECIPE_IMAGE_QUALITY', 85))
+RECIPE_IMAGE_MAX_SIZE = int(os.environ.get('RECIPE_IMAGE_MAX_SIZE', 2048))
+# Width buckets of the renditions listed in a recipe's srcset, rendered
+# after processing when RECIPE_IMAGE_PRERENDER is set, on first request
+# otherwise
+RECIPE_IMAGE_WIDTHS = (160, 320, 640, 1280)
+RECIPE_IMAGE_PRERENDER = bool(int(os.environ.get('RECIPE_IMAGE_PRERENDER', 1)))
+# Images still pending or processing after this many minutes were lost
+# by a worker that stopped, and are processed by process_stuck_images
+RECIPE_IMAGE_STUCK_MINUTES = int(
+    os.environ.get('RECIPE_IMAGE_STUCK_MINUTES', 15)
+)
+
+# Text search configuration used for recipe search vectors on postgres
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+# Tag and ingredient typeahead keeps sorted names of this many hot users
+# per process, skipping users with more than RECIPE_TYPEAHEAD_MAX_NAMES
+RECIPE_TYPEAHEAD_USERS = int(os.environ.get('RECIPE_TYPEAHEAD_USERS', 256))
+RECIPE_TYPEAHEAD_MAX_NAMES = int(
+    os.environ.get('RECIPE_TYPEAHEAD_MAX_NAMES', 5000)
+)
+
+# Resumable uploads are assembled here before being committed to storage
+RECIPE_UPLOAD_DIR = os.environ.get(
+    'RECIPE_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'recipe-uploads')
+)
+RECIPE_UPLOAD_MAX_SIZE = int(os.environ.get('RECIPE_UPLOAD_MAX_SIZE',
+                                            20 * 1024 * 1024))
+# Uploads receiving no chunk for this many hours expire, and are removed
+# with their files by the clear_expired_uploads command
+RECIPE_UPLOAD_EXPIRE_HOURS = int(
+    os.environ.get('RECIPE_UPLOAD_EXPIRE_HOURS', 24)
+)
+
+# Token authentication keeps snapshots of recently used tokens in process
+# for AUTH_TOKEN_CACHE_TTL seconds, and in the AUTH_TOKEN_SHARED_CACHE
+# cache, when set, for AUTH_TOKEN_SHARED_TTL seconds; a revoked token may
+# still be accepted by other processes until their snapshot expires
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 30))
+AUTH_TOKEN_SHARED_CACHE = os.environ.get('AUTH_TOKEN_SHARED_CACHE') or None
+AUTH_TOKEN_SHARED_TTL = int(os.environ.get('AUTH_TOKEN_SHARED_TTL', 300))
+
+# Signed access tokens are checked without the database for their
+# lifetime; sessions revoked through their refresh token are picked up
+# by every process within AUTH_REVOCATION_REFRESH seconds
+AUTH_ACCESS_TOKEN_TTL = int(os.environ.get('AUTH_ACCESS_TOKEN_TTL', 300))
+AUTH_REFRESH_TOKEN_TTL = int(os.environ.get('AUTH_REFRESH_TOKEN_TTL',
+                                            30 * 24 * 60 * 60))
+AUTH_REVOCATION_REFRESH = int(os.environ.get('AUTH_REVOCATION_REFRESH', 5))
+
+
+# Clients are identified by REMOTE_ADDR, or by the address NUM_PROXIES
+# hops from the end of X-Forwarded-For when that many trusted proxies
+# sit in front of the app; a client can put anything in that header
+REST_FRAMEWORK = {
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# Sign in attempts are throttled with token buckets holding the number of
+# attempts of each rate and refilling evenly over its period; buckets
+# live in process memory unless AUTH_THROTTLE_STORE is set to
+# user.throttling.CacheBucketStore, which uses the AUTH_THROTTLE_CACHE
+AUTH_THROTTLE_RATES = {
+    'login_ip': os.environ.get('AUTH_THROTTLE_LOGIN_IP', '60/min'),
+    'login_email': os.environ.get('AUTH_THROTTLE_LOGIN_EMAIL', '10/min'),
+}
+AUTH_THROTTLE_STORE = os.environ.get('AUTH_THROTTLE_STORE',
+                                     'user.throttling.LocalBucketStore')
+AUTH_THROTTLE_CACHE = os.environ.get('AUTH_THROTTLE_CACHE', 'default')
+AUTH_THROTTLE_LOCAL_SIZE = int(os.environ.get('AUTH_THROTTLE_LOCAL_SIZE',
+                                              100000))
+
+# At most PASSWORD_HASHING_WORKERS passwords are hashed at once, in the
+# requests themselves, so a burst of sign ins cannot take every CPU;
+# callers beyond the PASSWORD_HASHING_QUEUE waiting ones get a 503, and
+# 0 lifts the limit
+PASSWORD_HASHERS = [
+    'core.hashing.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS',
+                                              120000))
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 16))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -0,0 +1,108 @@
+import functools
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, connect, settings_dict):
+    """return the pool of key, creating it from the POOL settings"""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = settings_dict.get('POOL', {})
+            pool = _pools[key] = ConnectionPool(
+                connect=connect,
+                check=_check,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+                check_after=options.get('CHECK_AFTER', 30),
+            )
+        return pool
+
+
+def pool_stats():
+    """return {database alias: stats} of the pools of this process"""
+    with _pools_lock:
+        return {alias: pool.stats()
+                for (alias, _params), pool in _pools.items()}
+
+
+def close_pools():
+    """close every idle pooled connection of this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+def _connect(conn_params, isolation_level):
+    """open a connection the way the postgresql backend does"""
+    connection = base.Database.connect(**conn_params)
+    if isolation_level is not None and \
+            isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    return connection
+
+
+def _check(connection):
+    """return whether a connection that sat idle still works"""
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseCreation(base.DatabaseCreation):
+    """creation that lets go of pooled connections to the test database"""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """postgresql backend borrowing its connections from a process pool
+
+    closing the connection hands it back to the pool, so CONN_MAX_AGE
+    should be 0 to give it back at the end of every request
+    """
+    creation_class = DatabaseCreation
+    pooled = True
+
+    def get_new_connection(self, conn_params):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        pool = get_pool(
+            (self.alias, repr(sorted(conn_params.items()))),
+            functools.partial(_connect, conn_params, isolation_level),
+            self.settings_dict,
+        )
+        connection = pool.get()
+        if isolation_level is None:
+            isolation_level = connection.isolation_level
+        self.isolation_level = isolation_level
+        self._pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        usable = not connection.closed and not self.errors_occurred
+        if usable and connection.get_transaction_status() != \
+                extensions.TRANSACTION_STATUS_IDLE:
+            # never hand a half done transaction to the next borrower
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                usable = False
+        self._pool.put(connection, usable)
@@ -0,0 +1,145 @@
+import threading
+import time
+
+from django.db import connection as default_connection
+from django.db.utils import OperationalError
+
+
+class PoolExhausted(OperationalError):
+    """no connection was returned to a full pool in time"""
+
+
+class ConnectionPool:
+    """bounded pool of open connections shared by a process' threads
+
+    connect opens a new connection and check tells whether one that sat
+    idle for check_after seconds still works; the last returned
+    connection is handed out first so that rarely needed ones go idle
+    """
+
+    def __init__(self, connect, check, max_size, timeout, check_after):
+        self._connect = connect
+        self._check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """set all counters back to zero"""
+        with self._cond:
+            self.created = 0
+            self.reused = 0
+            self.discarded = 0
+            self.waits = 0
+            self.timeouts = 0
+            self.wait_time = 0.0
+
+    def _reserve(self):
+        """return an idle (connection, returned at), or None for a new one"""
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolExhausted(
+                        f'No database connection free after {self.timeout}s'
+                    )
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                self._cond.wait(remaining)
+            if waited:
+                self.wait_time += time.monotonic() - start
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+            return None
+
+    def get(self):
+        """check out a working connection, opening one if needed"""
+        entry = self._reserve()
+        if entry is not None:
+            connection, returned_at = entry
+            idle = time.monotonic() - returned_at
+            if idle < self.check_after or self._check(connection):
+                with self._cond:
+                    self.reused += 1
+                return connection
+            # keep the slot for the connection replacing the broken one
+            self._close(connection)
+            with self._cond:
+                self.discarded += 1
+        try:
+            connection = self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+        with self._cond:
+            self.created += 1
+        return connection
+
+    def put(self, connection, usable=True):
+        """check a connection back in, closing it when it is not usable"""
+        if not usable:
+            self._close(connection)
+            with self._cond:
+                self.discarded += 1
+            self._release_slot()
+            return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def close_idle(self):
+        """close every idle connection"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection, _returned_at in idle:
+            self._close(connection)
+
+    def stats(self):
+        """return the current size and counters"""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_ms': round(self.wait_time * 1000, 3),
+            }
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def release_connection():
+    """give a pooled connection back before a long wait on the client
+
+    the next query borrows one again; other connections are left open,
+    as reopening them costs a new connection, and nothing is released
+    inside a transaction
+    """
+    if getattr(default_connection, 'pooled', False) and \
+            not default_connection.in_atomic_block:
+        default_connection.close()
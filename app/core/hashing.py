@@ -0,0 +1,70 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+_lock = threading.Lock()
+_admitted = 0
+_slots = None
+_slots_size = None
+
+
+class HashingOverloaded(Exception):
+    """more password hashes were asked for than the limit admits
+
+    core.middleware.HashingOverloadedMiddleware answers it with a 503
+    """
+    # seconds a client should wait, sent as the Retry-After header
+    wait = 1
+
+
+def get_slots():
+    """return the semaphore bounding the hashes running at once"""
+    global _slots, _slots_size
+    with _lock:
+        if _slots_size != settings.PASSWORD_HASHING_WORKERS:
+            _slots = threading.BoundedSemaphore(
+                settings.PASSWORD_HASHING_WORKERS
+            )
+            _slots_size = settings.PASSWORD_HASHING_WORKERS
+        return _slots
+
+
+def run(func, *args):
+    """run a hashing call in the calling thread once a slot is free
+
+    at most PASSWORD_HASHING_WORKERS calls run at once and another
+    PASSWORD_HASHING_QUEUE wait for a slot; further callers are turned
+    away at once instead of queueing behind them
+    """
+    global _admitted
+    if settings.PASSWORD_HASHING_WORKERS <= 0:
+        return func(*args)
+    slots = get_slots()
+    with _lock:
+        limit = (settings.PASSWORD_HASHING_WORKERS +
+                 settings.PASSWORD_HASHING_QUEUE)
+        if _admitted >= limit:
+            raise HashingOverloaded()
+        _admitted += 1
+    try:
+        with slots:
+            return func(*args)
+    finally:
+        with _lock:
+            _admitted -= 1
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 hasher bounded by the hashing limit
+
+    the work factor comes from PASSWORD_HASH_ITERATIONS, and hashes made
+    with another count are upgraded on the next successful sign in
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        return run(super().encode, password, salt, iterations)
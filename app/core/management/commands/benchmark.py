@@ -0,0 +1,384 @@
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, Func, IntegerField, \
+    OuterRef, Subquery
+
+from core.models import Tag, Ingredient, Recipe
+
+
+class Dataset:
+    """ids of the seeded benchmark objects"""
+
+    def __init__(self, user, tag_ids, ingredient_ids, recipe_ids):
+        self.user = user
+        self.tag_ids = tag_ids
+        self.ingredient_ids = ingredient_ids
+        self.recipe_ids = recipe_ids
+
+
+def bulk_create(model, objs, batch_size=1000):
+    """bulk insert objs in batches the database backend can take"""
+    fields = [field.name for field in model._meta.concrete_fields]
+    batch_size = min(batch_size,
+                     connection.ops.bulk_batch_size(fields, objs) or 1)
+    model.objects.bulk_create(objs, batch_size=batch_size)
+
+
+def seed(recipes, tags, ingredients, tags_per_recipe=3,
+         ingredients_per_recipe=5):
+    """seed one user with a recipe book of the given size"""
+    rng = random.Random(0)
+    user = get_user_model().objects.create_user(
+        email=f'benchmark-{time.time()}@example.com',
+        password=None
+    )
+    bulk_create(Tag, [Tag(user=user, name=f'tag {i}') for i in range(tags)])
+    bulk_create(Ingredient, [Ingredient(user=user, name=f'ingredient {i}')
+                             for i in range(ingredients)])
+    bulk_create(Recipe, [Recipe(user=user, title=f'recipe {i}',
+                                time_minutes=i % 120, price=i % 100)
+                         for i in range(recipes)])
+    tag_ids = list(Tag.objects.filter(user=user).values_list('id', flat=True))
+    ingredient_ids = list(
+        Ingredient.objects.filter(user=user).values_list('id', flat=True)
+    )
+    recipe_ids = list(
+        Recipe.objects.filter(user=user).values_list('id', flat=True)
+    )
+
+    tag_rows = []
+    ingredient_rows = []
+    for recipe_id in recipe_ids:
+        for tag_id in rng.sample(tag_ids, min(tags_per_recipe, len(tag_ids))):
+            tag_rows.append(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            )
+        for ingredient_id in rng.sample(
+                ingredient_ids,
+                min(ingredients_per_recipe, len(ingredient_ids))):
+            ingredient_rows.append(Recipe.ingredients.through(
+                recipe_id=recipe_id, ingredient_id=ingredient_id
+            ))
+    bulk_create(Recipe.tags.through, tag_rows)
+    bulk_create(Recipe.ingredients.through, ingredient_rows)
+    Tag.objects.filter(user=user).recount_recipes()
+    Ingredient.objects.filter(user=user).recount_recipes()
+    return Dataset(user, tag_ids, ingredient_ids, recipe_ids)
+
+
+def timed(func, repeat):
+    """return the best wall time of `repeat` calls to func in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def explain(queryset):
+    """return the query plan for a queryset"""
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True)
+    return queryset.explain()
+
+
+def scenario_explain(command, dataset):
+    """show the plans of the per-user hot queries"""
+    user = dataset.user
+    tag_id = dataset.tag_ids[0]
+    queries = (
+        ('tag list', Tag.objects.filter(user=user).order_by('-name', 'id')),
+        ('ingredient list',
+         Ingredient.objects.filter(user=user).order_by('-name', 'id')),
+        ('recipe list', Recipe.objects.filter(user=user).order_by('-id')),
+        ('recipes by tag',
+         Recipe.objects.filter(user=user, tags__id__in=[tag_id])),
+    )
+    for label, queryset in queries:
+        command.stdout.write(command.style.MIGRATE_HEADING(label))
+        command.stdout.write(explain(queryset[:100]))
+
+
+def scenario_assigned_only(command, dataset):
+    """compare DISTINCT over the m2m join with an EXISTS semi-join"""
+    user = dataset.user
+    links = Recipe.tags.through.objects.filter(tag_id=OuterRef('pk'))
+    queries = (
+        ('join + distinct', Tag.objects.filter(
+            user=user, recipe__isnull=False
+        ).order_by('-name', 'id').distinct()),
+        ('exists', Tag.objects.filter(user=user).annotate(
+            assigned=Exists(links)
+        ).filter(assigned=True).order_by('-name', 'id')),
+    )
+    for label, queryset in queries:
+        elapsed = timed(lambda: list(queryset.all()), command.repeat)
+        command.stdout.write(f'{label:<20} {elapsed:8.2f} ms')
+
+
+def scenario_popularity(command, dataset):
+    """compare counting recipe links per row with the counter column"""
+    user = dataset.user
+    counts = Recipe.tags.through.objects.filter(
+        tag_id=OuterRef('pk')
+    ).order_by().annotate(
+        total=Func(F('recipe_id'), function='COUNT')
+    ).values('total')
+    queries = (
+        ('count subquery', Tag.objects.filter(user=user).annotate(
+            popularity=Subquery(counts, output_field=IntegerField())
+        ).order_by('-popularity', 'id')),
+        ('counter column', Tag.objects.filter(user=user).order_by(
+            '-recipe_count', 'id'
+        )),
+    )
+    for label, queryset in queries:
+        elapsed = timed(lambda: list(queryset[:100]), command.repeat)
+        command.stdout.write(f'{label:<20} {elapsed:8.2f} ms')
+
+
+def scenario_recipe_filters(command, dataset):
+    """compare m2m joins with grouped subqueries for recipe filters"""
+    user = dataset.user
+    tag_ids = dataset.tag_ids[:3]
+    links = Recipe.tags.through.objects.filter(
+        tag_id__in=tag_ids
+    ).values('recipe_id')
+    queries = (
+        ('any: join + distinct', Recipe.objects.filter(
+            user=user, tags__id__in=tag_ids
+        ).distinct()),
+        ('any: exists', Recipe.objects.filter(user=user).annotate(
+            matched=Exists(links.filter(recipe_id=OuterRef('pk')))
+        ).filter(matched=True)),
+        ('all: repeated joins', Recipe.objects.filter(
+            user=user, tags__id=tag_ids[0]
+        ).filter(tags__id=tag_ids[1]).filter(tags__id=tag_ids[2])),
+        ('all: having count', Recipe.objects.filter(
+            user=user,
+            id__in=links.annotate(matched=Count('tag')).filter(
+                matched=len(tag_ids)
+            ).values('recipe_id')
+        )),
+    )
+    for label, queryset in queries:
+        queryset = queryset.order_by('-id')
+        elapsed = timed(lambda: list(queryset[:100]), command.repeat)
+        command.stdout.write(f'{label:<22} {elapsed:8.2f} ms')
+
+
+def scenario_serializers(command, dataset):
+    """compare model serializers with the values() fast path per 1k rows"""
+    from recipe.fastpath import RowSerializer
+    from recipe.serializer import RecipeSerializer, TagSerializer
+
+    user = dataset.user
+    recipes = Recipe.objects.filter(user=user).order_by('-id')
+    tags = Tag.objects.filter(user=user).order_by('-name')
+    cases = (
+        ('recipes', Recipe, RecipeSerializer,
+         recipes.prefetch_related('tags', 'ingredients')),
+        ('tags', Tag, TagSerializer, tags),
+    )
+    for label, model, serializer_class, queryset in cases:
+        queryset = queryset[:1000]
+        rows = len(queryset)
+        row_serializer = RowSerializer(serializer_class)
+        slow = timed(lambda: serializer_class(queryset.all(), many=True).data,
+                     command.repeat)
+        fast = timed(lambda: row_serializer.to_representation(
+            model, row_serializer.rows(queryset.all())
+        ), command.repeat)
+        scale = 1000 / max(rows, 1)
+        command.stdout.write(
+            f'{label:<8} serializer {slow * scale:8.2f} ms/1k  '
+            f'rows {fast * scale:8.2f} ms/1k  ({slow / fast:.1f}x)'
+        )
+
+
+def scenario_search(command, dataset):
+    """compare the ranked tsvector search with substring matching"""
+    from recipe import search
+
+    start = time.perf_counter()
+    search.update_search_vectors(dataset.recipe_ids)
+    command.stdout.write(
+        f'{"build vectors":<12} {(time.perf_counter() - start) * 1000:8.2f} ms'
+    )
+    recipes = Recipe.objects.filter(user=dataset.user)
+    strategies = [('substring', search.substring_search)]
+    if search.is_supported():
+        strategies.append(('tsvector', search.ranked_search))
+    for label, strategy in strategies:
+        queryset, ordering = strategy(recipes, 'recipe ingredient 7')
+        queryset = queryset.order_by(*ordering)
+        elapsed = timed(lambda: list(queryset[:100]), command.repeat)
+        command.stdout.write(f'{label:<12} {elapsed:8.2f} ms')
+
+
+def scenario_logins(command, dataset):
+    """measure sign ins and API reads running side by side
+
+    sign ins hash under the hashing limit while other threads serialize
+    tags, so the API throughput shows what a burst of sign ins costs it
+    """
+    from django.contrib.auth.hashers import check_password, make_password
+    from core.hashing import HashingOverloaded
+    from recipe.serializer import TagSerializer
+
+    encoded = make_password('benchmark')
+    tags = list(Tag.objects.filter(user=dataset.user)[:100])
+    counts = {'sign ins': 0, 'rejected': 0, 'api reads': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + command.seconds
+
+    def sign_in():
+        while time.perf_counter() < deadline:
+            try:
+                check_password('benchmark', encoded)
+                key = 'sign ins'
+            except HashingOverloaded:
+                key = 'rejected'
+                # a client backing off before retrying
+                time.sleep(0.01)
+            with lock:
+                counts[key] += 1
+
+    def read():
+        while time.perf_counter() < deadline:
+            TagSerializer(tags, many=True).data
+            with lock:
+                counts['api reads'] += 1
+
+    threads = [threading.Thread(target=sign_in)
+               for _ in range(command.sign_ins)]
+    threads += [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for label, count in counts.items():
+        command.stdout.write(
+            f'{label:<12} {count / command.seconds:10.1f} /s'
+        )
+
+
+def scenario_connections(command, dataset):
+    """compare requests/s with new, persistent and pooled connections
+
+    every simulated request borrows the connection, runs a small query
+    and ends like a real request does; each client thread has its own
+    connection wrapper, as request threads do
+    """
+    from django.db.utils import load_backend
+
+    if connection.vendor != 'postgresql':
+        command.stdout.write('needs postgresql, skipped')
+        return
+    from core.db.backends.postgresql_pool.base import close_pools, \
+        pool_stats
+
+    modes = (
+        ('new connection', 'django.db.backends.postgresql', 0),
+        ('persistent', 'django.db.backends.postgresql', 60),
+        ('pooled', 'core.db.backends.postgresql_pool', 0),
+    )
+    for label, engine, max_age in modes:
+        settings_dict = dict(connection.settings_dict, ENGINE=engine,
+                             CONN_MAX_AGE=max_age)
+        backend = load_backend(engine)
+        counts = []
+        deadline = time.perf_counter() + command.seconds
+
+        def client():
+            wrapper = backend.DatabaseWrapper(settings_dict,
+                                              f'benchmark-{label}')
+            served = 0
+            while time.perf_counter() < deadline:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                # what request_finished does at the end of a request
+                wrapper.close_if_unusable_or_obsolete()
+                served += 1
+            wrapper.close()
+            counts.append(served)
+
+        threads = [threading.Thread(target=client)
+                   for _ in range(command.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        command.stdout.write(
+            f'{label:<16} {sum(counts) / command.seconds:10.1f} req/s'
+        )
+    for alias, stats in pool_stats().items():
+        command.stdout.write(f'{alias}: {stats}')
+    close_pools()
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe queries on seeded data"""
+    help = 'Seed a throwaway recipe book and benchmark queries against it'
+
+    scenarios = {
+        'explain': scenario_explain,
+        'assigned_only': scenario_assigned_only,
+        'popularity': scenario_popularity,
+        'recipe_filters': scenario_recipe_filters,
+        'serializers': scenario_serializers,
+        'search': scenario_search,
+        'logins': scenario_logins,
+        'connections': scenario_connections,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', nargs='*',
+                            help='scenarios to run, defaults to all')
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seconds', type=float, default=2.0,
+                            help='duration of the throughput scenarios')
+        parser.add_argument('--sign-ins', type=int, default=8,
+                            help='concurrent sign in threads')
+        parser.add_argument('--clients', type=int, default=4,
+                            help='concurrent database clients')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the seeded data after the run')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        names = options['scenario'] or list(self.scenarios)
+        unknown = set(names) - set(self.scenarios)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+        self.repeat = options['repeat']
+        self.seconds = options['seconds']
+        self.sign_ins = options['sign_ins']
+        self.clients = options['clients']
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            dataset = seed(options['recipes'], options['tags'],
+                           options['ingredients'])
+            self.stdout.write(
+                f'Seeded {len(dataset.recipe_ids)} recipes in '
+                f'{time.perf_counter() - start:.1f}s'
+            )
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            for name in names:
+                self.stdout.write(self.style.SUCCESS(f'== {name}'))
+                self.scenarios[name](self, dataset)
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ImageUpload
+
+
+class Command(BaseCommand):
+    """Django command to remove resumable uploads left unfinished"""
+    help = 'Delete expired image uploads and their partial files'
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        from recipe import uploads
+
+        # the post_delete receiver removes the files of every upload
+        deleted, _rows = ImageUpload.objects.filter(
+            updated_at__lt=uploads.expiry_cutoff()
+        ).delete()
+        self.stdout.write(f'Deleted {deleted} expired uploads')
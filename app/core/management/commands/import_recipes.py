@@ -0,0 +1,244 @@
+import csv
+import io
+import json
+import os
+import time
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Tag, Ingredient, Recipe, ImportCheckpoint
+
+RECIPE_FIELDS = ('title', 'time_minutes', 'price', 'link')
+
+
+def read_records(path, fmt):
+    """yield the records of a csv or ndjson file one at a time"""
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            for row in csv.DictReader(source):
+                for relation in ('tags', 'ingredients'):
+                    names = row.get(relation) or ''
+                    row[relation] = [name for name in names.split('|')
+                                     if name.strip()]
+                yield row
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class NameMap:
+    """per user name -> id map of tags or ingredients
+
+    names are matched case insensitively like the unique index does;
+    each user's existing names are loaded with one query the first time
+    the user is seen, missing names are created per batch
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+
+    def _load(self, user_id):
+        if user_id not in self.ids:
+            self.ids[user_id] = {
+                name.lower(): pk for name, pk in self.model.objects.filter(
+                    user_id=user_id
+                ).values_list('name', 'id')
+            }
+        return self.ids[user_id]
+
+    def resolve(self, pairs):
+        """make sure every (user_id, name) pair has an id"""
+        missing = defaultdict(list)
+        for user_id, name in pairs:
+            if name.lower() not in self._load(user_id):
+                missing[user_id].append(name)
+        for user_id, names in missing.items():
+            found, _created = self.model.objects.get_or_create_names(
+                user_id, names
+            )
+            self.ids[user_id].update(
+                (key, obj.pk) for key, obj in found.items()
+            )
+
+    def __getitem__(self, pair):
+        user_id, name = pair
+        return self.ids[user_id][name.lower()]
+
+
+class Command(BaseCommand):
+    """Django command to import recipes from a csv or ndjson dump"""
+    help = 'Stream recipes from a csv or ndjson file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help='defaults to the file extension')
+        parser.add_argument('--user',
+                            help='email of the owner of every recipe, '
+                                 'otherwise read from the email column')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--checkpoint',
+                            help='name under which progress is recorded in '
+                                 'the database, used to resume')
+        parser.add_argument('--copy', action='store_true',
+                            help='load m2m rows with COPY on postgres')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        self.use_copy = options['copy'] and connection.vendor == 'postgresql'
+        self.checkpoint = options['checkpoint']
+        self.users = {}
+        self.default_user = None
+        if options['user']:
+            self.default_user = self._user_id(options['user'])
+            if self.default_user is None:
+                raise CommandError(f"Unknown user {options['user']}")
+        self.tags = NameMap(Tag)
+        self.ingredients = NameMap(Ingredient)
+
+        done = self._read_checkpoint(path)
+        if done:
+            self.stdout.write(f'Resuming after record {done}')
+        start = time.perf_counter()
+        imported = skipped = 0
+        batch = []
+        position = 0
+        for position, record in enumerate(read_records(path, fmt), 1):
+            if position <= done:
+                continue
+            try:
+                batch.append(self._clean(record))
+            except (ValidationError, KeyError, TypeError) as error:
+                skipped += 1
+                self.stderr.write(f'Skipping record {position}: {error}')
+            if len(batch) >= options['batch_size']:
+                imported += self._write(batch, path, position)
+                batch = []
+                self._report(imported, start)
+        imported += self._write(batch, path, position)
+
+        self._report(imported, start)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, skipped {skipped}'
+        ))
+
+    def _read_checkpoint(self, path):
+        """return the number of records already imported from path"""
+        if not self.checkpoint:
+            return 0
+        state = ImportCheckpoint.objects.filter(name=self.checkpoint).first()
+        if state is None:
+            return 0
+        if state.path != os.path.abspath(path):
+            raise CommandError('Checkpoint belongs to another file')
+        return state.position
+
+    def _save_checkpoint(self, path, position):
+        if not self.checkpoint:
+            return
+        ImportCheckpoint.objects.update_or_create(
+            name=self.checkpoint,
+            defaults={'path': os.path.abspath(path), 'position': position}
+        )
+
+    def _report(self, imported, start):
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f'{imported} recipes, {rate:.0f} rows/sec')
+
+    def _user_id(self, email):
+        if email not in self.users:
+            self.users[email] = get_user_model().objects.filter(
+                email=get_user_model().objects.normalize_email(email)
+            ).values_list('id', flat=True).first()
+        return self.users[email]
+
+    def _clean(self, record):
+        """validate a record without touching the recipe tables"""
+        user_id = self.default_user or self._user_id(record.get('email'))
+        if user_id is None:
+            raise ValidationError(f"unknown user {record.get('email')}")
+        values = {}
+        for name in RECIPE_FIELDS:
+            field = Recipe._meta.get_field(name)
+            value = record.get(name)
+            if value is None and field.blank:
+                value = ''
+            values[name] = field.clean(value, None)
+        return {
+            'user_id': user_id,
+            'values': values,
+            'tags': [str(name).strip() for name in record.get('tags') or ()],
+            'ingredients': [str(name).strip()
+                            for name in record.get('ingredients') or ()],
+        }
+
+    def _write(self, batch, path, position):
+        """insert one batch of records in a transaction"""
+        from recipe.bulk import insert_objects
+        from recipe.cache import bump_generation
+        from recipe.search import update_search_vectors
+
+        if not batch:
+            self._save_checkpoint(path, position)
+            return 0
+        with transaction.atomic():
+            self.tags.resolve((item['user_id'], name)
+                              for item in batch for name in item['tags'])
+            self.ingredients.resolve((item['user_id'], name)
+                                     for item in batch
+                                     for name in item['ingredients'])
+            recipes = insert_objects(Recipe, [
+                Recipe(user_id=item['user_id'], **item['values'])
+                for item in batch
+            ])
+            for relation, names in (('tags', self.tags),
+                                    ('ingredients', self.ingredients)):
+                rows = {
+                    (recipe.pk, names[(item['user_id'], name)])
+                    for recipe, item in zip(recipes, batch)
+                    for name in item[relation]
+                }
+                self._insert_links(relation, rows)
+                names.model.objects.filter(
+                    pk__in={related_id for _recipe_id, related_id in rows}
+                ).recount_recipes()
+            update_search_vectors(recipe.pk for recipe in recipes)
+            # committed with the batch, so a resume never replays it
+            self._save_checkpoint(path, position)
+        for user_id in {item['user_id'] for item in batch}:
+            bump_generation(user_id)
+        return len(batch)
+
+    def _insert_links(self, relation, rows):
+        """insert m2m rows, with COPY when asked to on postgres"""
+        from recipe.fastpath import m2m_columns
+
+        through, source, target = m2m_columns(Recipe, relation)
+        if not rows:
+            return
+        if not self.use_copy:
+            through.objects.bulk_create([
+                through(**{source: recipe_id, target: related_id})
+                for recipe_id, related_id in rows
+            ])
+            return
+        data = io.StringIO(''.join(
+            f'{recipe_id}\t{related_id}\n' for recipe_id, related_id in rows
+        ))
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {through._meta.db_table} ({source}, {target}) '
+                f'FROM STDIN',
+                data
+            )
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to process images lost by a stopped worker"""
+    help = 'Process recipe images left pending or processing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int,
+                            default=settings.RECIPE_IMAGE_STUCK_MINUTES,
+                            help='minutes an image waits before it is '
+                                 'considered lost')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        from recipe import images
+
+        processed = 0
+        for recipe_id, name in images.stuck(options['minutes']):
+            images.process(recipe_id, name)
+            processed += 1
+        self.stdout.write(f'Processed {processed} stuck images')
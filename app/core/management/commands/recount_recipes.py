@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """Django command to recompute the recipe counters of names"""
+    help = 'Recompute recipe_count of every tag and ingredient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='objects updated per transaction')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            updated = 0
+            last_id = 0
+            while True:
+                ids = list(model.objects.filter(id__gt=last_id).order_by(
+                    'id'
+                ).values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                # short transactions keep row locks away from live writes
+                with transaction.atomic():
+                    updated += model.objects.filter(
+                        id__in=ids
+                    ).recount_recipes()
+                last_id = ids[-1]
+            self.stdout.write(
+                f'Recounted {updated} {model._meta.verbose_name_plural}'
+            )
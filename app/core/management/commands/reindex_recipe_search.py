@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the stored recipe search vectors"""
+    help = 'Recompute search_vector of every recipe, e.g. after changing ' \
+           'RECIPE_SEARCH_CONFIG'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='recipes updated per transaction')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        from recipe.search import is_supported, update_search_vectors
+
+        if not is_supported():
+            self.stdout.write('Search vectors are only kept on postgres')
+            return
+        batch_size = options['batch_size']
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(Recipe.objects.filter(id__gt=last_id).order_by(
+                'id'
+            ).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            # short transactions keep row locks away from live writes
+            with transaction.atomic():
+                update_search_vectors(ids)
+            updated += len(ids)
+            last_id = ids[-1]
+        self.stdout.write(f'Reindexed {updated} recipes')
@@ -0,0 +1,28 @@
+from django.http import JsonResponse
+from django.utils.translation import ugettext as _
+
+from .hashing import HashingOverloaded
+
+
+class HashingOverloadedMiddleware:
+    """answer requests turned away by the password hashing limit with 503
+
+    it covers the api views as well as the admin login, which would
+    otherwise fail with a 500
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingOverloaded):
+            return None
+        response = JsonResponse(
+            {'detail': _('Too many sign ins at once, try again shortly.')},
+            status=503
+        )
+        response['Retry-After'] = str(exception.wait)
+        return response
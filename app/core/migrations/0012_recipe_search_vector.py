@@ -0,0 +1,54 @@
+# Generated by Django 2.1.15 on 2026-10-17 16:00
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """index and fill the search vectors, postgres only
+
+    the vectors use the configuration queries use; after changing
+    RECIPE_SEARCH_CONFIG run reindex_recipe_search
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_search_idx ON core_recipe '
+        'USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        "UPDATE core_recipe AS r SET search_vector = "
+        "setweight(to_tsvector(%s::regconfig, r.title), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(("
+        "SELECT string_agg(t.name, ' ') FROM core_tag t "
+        "JOIN core_recipe_tags rt ON rt.tag_id = t.id "
+        "WHERE rt.recipe_id = r.id), '')), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(("
+        "SELECT string_agg(i.name, ' ') FROM core_ingredient i "
+        "JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id "
+        "WHERE ri.recipe_id = r.id), '')), 'C')",
+        [settings.RECIPE_SEARCH_CONFIG] * 3
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX core_recipe_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+TABLES = ('core_tag', 'core_ingredient')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """index tag and ingredient names for typeahead, postgres only
+
+    the upper() index serves the istartswith prefix lookups and the
+    plain one the trigram similarity lookups
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX {table}_name_upper_trgm_idx ON {table} '
+            f'USING gin ((UPPER(name::text)) gin_trgm_ops)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {table}_name_trgm_idx ON {table} '
+            f'USING gin (name gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP INDEX {table}_name_upper_trgm_idx')
+        schema_editor.execute(f'DROP INDEX {table}_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def merge(apps, model_name, relation):
+    """merge the names of a user that only differ by case
+
+    the oldest object is kept and the recipe links of the others are
+    moved to it, unless the recipe already links the kept one
+    """
+    model = apps.get_model('core', model_name)
+    through = apps.get_model('core', 'Recipe')._meta.get_field(
+        relation
+    ).remote_field.through
+    column = f'{model_name.lower()}_id'
+
+    names = model.objects.annotate(key=Lower('name'))
+    groups = names.values('user_id', 'key').annotate(
+        total=Count('id')
+    ).filter(total__gt=1).order_by()
+    for group in groups:
+        ids = sorted(names.filter(
+            user_id=group['user_id'], key=group['key']
+        ).values_list('id', flat=True))
+        keep, duplicates = ids[0], ids[1:]
+        linked = set(through.objects.filter(
+            **{column: keep}
+        ).values_list('recipe_id', flat=True))
+        for recipe_id, pk in through.objects.filter(
+                **{f'{column}__in': duplicates}
+        ).values_list('recipe_id', 'pk'):
+            if recipe_id in linked:
+                through.objects.filter(pk=pk).delete()
+            else:
+                through.objects.filter(pk=pk).update(**{column: keep})
+                linked.add(recipe_id)
+        model.objects.filter(pk__in=duplicates).delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    merge(apps, 'Tag', 'tags')
+    merge(apps, 'Ingredient', 'ingredients')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX core_tag_user_lower_name_uniq '
+             'ON core_tag (user_id, lower(name))'],
+            ['DROP INDEX core_tag_user_lower_name_uniq'],
+        ),
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX core_ingr_user_lower_name_uniq '
+             'ON core_ingredient (user_id, lower(name))'],
+            ['DROP INDEX core_ingr_user_lower_name_uniq'],
+        ),
+    ]
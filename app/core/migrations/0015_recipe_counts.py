@@ -0,0 +1,58 @@
+# Generated by Django 2.1.15 on 2026-10-17 16:09
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery
+
+
+def count_recipes(apps, schema_editor):
+    """start the counters from the existing recipe links"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', name)
+        through = getattr(Recipe, relation).through
+        counts = through.objects.filter(**{
+            f'{name.lower()}_id': OuterRef('pk')
+        }).order_by().annotate(
+            total=Func(F('recipe_id'), function='COUNT')
+        ).values('total')
+        model.objects.update(recipe_count=Subquery(
+            counts, output_field=models.IntegerField()
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_unique_lower_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_ingr_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_tag_user_count_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+        # sqlite rebuilds the tables to add a column, losing the indexes
+        # created with raw SQL by 0014
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX IF NOT EXISTS core_tag_user_lower_name_uniq '
+             'ON core_tag (user_id, lower(name))',
+             'CREATE UNIQUE INDEX IF NOT EXISTS core_ingr_user_lower_name_uniq '
+             'ON core_ingredient (user_id, lower(name))'],
+            migrations.RunSQL.noop,
+        ),
+    ]
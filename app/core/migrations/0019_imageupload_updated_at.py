@@ -0,0 +1,20 @@
+# Generated by Django 2.1.15 on 2026-10-17 21:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
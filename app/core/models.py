@@ -1,10 +1,15 @@
 import uuid
 import os
-from django.db import models
+from django.db import connections, models, IntegrityError, transaction
+from django.db.models import F, Func, OuterRef, Subquery
+from django.db.models.functions import Lower
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser,BaseUserManager, \
     PermissionsMixin
 from django.conf import settings
 
+from .storage import image_storage
+
 
 def recipe_image_file_path(instance,filename):
     """genrate file path for recipe image"""
@@ -44,12 +49,138 @@ class User(AbstractBaseUser,PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+
+class NameQuerySet(models.QuerySet):
+    """queryset of tags or ingredients with their recipe counters"""
+
+    def _recipe_links(self):
+        """return the recipe m2m rows pointing at the outer object"""
+        relation = self.model._meta.get_field('recipe')
+        column = f'{relation.field.m2m_reverse_field_name()}_id'
+        return relation.through.objects.filter(
+            **{column: OuterRef('pk')}
+        ).order_by()
+
+    def recount_recipes(self):
+        """recompute recipe_count of every object from the m2m rows"""
+        # a bare COUNT() keeps the subquery free of a GROUP BY
+        counts = self._recipe_links().annotate(
+            total=Func(F('recipe_id'), function='COUNT')
+        ).values('total')
+        return self.update(recipe_count=Subquery(
+            counts, output_field=models.IntegerField()
+        ))
+
+    def shift_recipe_count(self, delta):
+        """atomically add delta to recipe_count of every object"""
+        if not delta:
+            return 0
+        return self.update(recipe_count=F('recipe_count') + delta)
+
+
+class NameManager(models.Manager.from_queryset(NameQuerySet)):
+    """manager of the per user, case insensitively unique names
+
+    the uniqueness comes from a unique index on (user_id, lower(name))
+    created by a migration, since it cannot be declared on the model
+    """
+
+    def _existing(self, user_id, keys):
+        """return {lowercased name: object} of the user's matching names"""
+        return {obj.name.lower(): obj for obj in self.annotate(
+            key=Lower('name')
+        ).filter(user_id=user_id, key__in=list(keys))}
+
+    def _insert(self, user_id, names):
+        """insert the names, skipping those that exist, return the new ones"""
+        objs = [self.model(user_id=user_id, name=name) for name in names]
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            created = []
+            for obj in objs:
+                try:
+                    with transaction.atomic(using=self.db):
+                        obj.save(force_insert=True, using=self.db)
+                except IntegrityError:
+                    continue
+                created.append(obj)
+            return created
+
+        fields = [field for field in self.model._meta.concrete_fields
+                  if not field.primary_key]
+        row = '({})'.format(', '.join(['%s'] * len(fields)))
+        sql = (
+            'INSERT INTO {table} ({columns}) VALUES {rows} '
+            'ON CONFLICT (user_id, lower(name)) DO NOTHING '
+            'RETURNING id, name'
+        ).format(
+            table=connection.ops.quote_name(self.model._meta.db_table),
+            columns=', '.join(connection.ops.quote_name(field.column)
+                              for field in fields),
+            rows=', '.join([row] * len(objs)),
+        )
+        params = [field.get_db_prep_save(getattr(obj, field.attname),
+                                         connection)
+                  for obj in objs for field in fields]
+        by_name = {obj.name: obj for obj in objs}
+        created = []
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for pk, name in cursor.fetchall():
+                obj = by_name[name]
+                obj.pk = pk
+                obj._state.adding = False
+                obj._state.db = self.db
+                created.append(obj)
+        return created
+
+    def get_or_create_names(self, user_id, names):
+        """return ({lowercased name: object}, created keys) for names
+
+        names differing only by case share one object, and concurrent
+        callers never create duplicates; no signals are sent for the
+        objects inserted on postgres
+        """
+        wanted = {}
+        for name in names:
+            wanted.setdefault(name.lower(), name)
+        found = self._existing(user_id, wanted) if wanted else {}
+        missing = [name for key, name in wanted.items() if key not in found]
+        if not missing:
+            return found, set()
+        created = {obj.name.lower(): obj
+                   for obj in self._insert(user_id, missing)}
+        found.update(created)
+        lost = [name.lower() for name in missing
+                if name.lower() not in created]
+        if lost:
+            # created by a concurrent request since we looked
+            found.update(self._existing(user_id, lost))
+        return found, set(created)
+
+    def get_or_create_name(self, user, name):
+        """return (object, created) for a name of the user"""
+        found, created = self.get_or_create_names(user.pk, [name])
+        return found[name.lower()], name.lower() in created
+
+
 class Tag(models.Model):
     """models for recipe tags"""
     name = models.CharField(max_length=500)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE,
                              )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NameManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='core_tag_user_name_idx'),
+            models.Index(fields=['user', '-recipe_count'],
+                         name='core_tag_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,6 +192,17 @@ class Ingredient(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE,
                              )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NameManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'],
+                         name='core_ingr_user_name_idx'),
+            models.Index(fields=['user', '-recipe_count'],
+                         name='core_ingr_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,6 +210,19 @@ class Ingredient(models.Model):
 
 class Recipe(models.Model):
     """recipe object model"""
+    IMAGE_NONE = 'none'
+    IMAGE_PENDING = 'pending'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_NONE, 'No image'),
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -76,7 +231,82 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255,blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True,upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True,upload_to=recipe_image_file_path,
+                              storage=image_storage)
+    image_status = models.CharField(max_length=10,
+                                    choices=IMAGE_STATUS_CHOICES,
+                                    default=IMAGE_NONE)
+    image_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # maintained by recipe.search on postgres, left null elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class StoredFile(models.Model):
+    """reference count of a content addressed image file"""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
+
+
+class ImageUpload(models.Model):
+    """a resumable upload of a recipe image, received in chunks"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # moved by every received chunk, expiring uploads left unfinished
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.offset}/{self.size}'
+
+
+class RefreshToken(models.Model):
+    """a signed token session, renewed by presenting its current secret
+
+    only a hash of the secret is stored, and every refresh replaces it;
+    sessions outlive a deleted user so their revocation is still seen
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True,
+                             on_delete=models.SET_NULL)
+    secret_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.id}'
+
+
+class ImportCheckpoint(models.Model):
+    """progress of a resumable recipe import
+
+    written in the transaction of every imported batch, so a resumed
+    import never replays a committed batch
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    path = models.CharField(max_length=1024)
+    position = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
@@ -0,0 +1,120 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils.deconstruct import deconstructible
+
+# sent once the last reference to a stored file is gone and it is deleted
+file_orphaned = Signal(providing_args=['name'])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """storage naming files after the sha256 of their content
+
+    the directory of the requested name and its extension are kept, so
+    saving content that is already stored returns the existing file.
+    save locks the reference row of the file, so callers acquire the
+    name in the same transaction to keep collect from deleting it
+    """
+
+    def content_name(self, name, content):
+        """return the name content is stored under"""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], f'{digest}{ext}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        with transaction.atomic():
+            # a collect of the name either finished deleting the file or
+            # waits until this transaction has acquired it
+            _lock_row(name)
+            if self.exists(name):
+                return name
+            saved = super().save(name, content, max_length)
+        if saved != name:
+            # another writer stored the same content meanwhile
+            self.delete(saved)
+        return name
+
+
+image_storage = ContentAddressedStorage()
+
+
+def _lock_row(name):
+    """lock the reference row of a stored file, creating it if needed"""
+    from .models import StoredFile
+
+    while True:
+        if StoredFile.objects.select_for_update().filter(name=name).first():
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, refs=0)
+            return
+        except IntegrityError:
+            # created by another writer meanwhile, lock theirs
+            continue
+
+
+def acquire(name):
+    """add a reference to a stored file"""
+    from .models import StoredFile
+
+    if not name:
+        return
+    if StoredFile.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refs=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """drop a reference to a stored file, deleting it after the last one
+
+    the file is only deleted once the transaction commits, and only if
+    nothing referenced it again in the meantime
+    """
+    from .models import StoredFile
+
+    if not name:
+        return
+    StoredFile.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    """delete a stored file nothing references anymore
+
+    the row stays locked until the file is gone, so a save of the same
+    content either sees the file or writes it again
+    """
+    from .models import StoredFile
+
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(
+            name=name, refs=0
+        ).first()
+        if stored is None:
+            return
+        stored.delete()
+        image_storage.delete(name)
+    file_orphaned.send(sender=StoredFile, name=name)
@@ -1,8 +1,17 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+
+from django.contrib.auth import get_user_model
+
+from core.models import ImportCheckpoint, Recipe, Tag
 
 
 class CommandsTestCase(TestCase):
@@ -27,3 +36,190 @@ class CommandsTestCase(TestCase):
             call_command('wait_for_db')
             print('end  two')
             self.assertEqual(gi.call_count, 6)
+
+    def test_benchmark_explain(self):
+        """Test the benchmark command seeds data and rolls it back"""
+        out = StringIO()
+        call_command('benchmark', 'explain', recipes=20, tags=5,
+                     ingredients=5, stdout=out)
+        self.assertIn('recipe list', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_assigned_only(self):
+        """Test the assigned_only benchmark reports both strategies"""
+        out = StringIO()
+        call_command('benchmark', 'assigned_only', recipes=20, tags=5,
+                     ingredients=5, repeat=1, stdout=out)
+        self.assertIn('exists', out.getvalue())
+
+    def test_benchmark_popularity(self):
+        """Test the popularity benchmark reports both strategies"""
+        out = StringIO()
+        call_command('benchmark', 'popularity', recipes=20, tags=5,
+                     ingredients=5, repeat=1, stdout=out)
+        self.assertIn('counter column', out.getvalue())
+
+    def test_recount_recipes(self):
+        """Test the recount command repairs drifted counters"""
+        user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe = Recipe.objects.create(user=user, title='githeri',
+                                       time_minutes=60, price=5.00)
+        recipe.tags.add(tag)
+        Tag.objects.update(recipe_count=7)
+
+        out = StringIO()
+        call_command('recount_recipes', batch_size=1, stdout=out)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertIn('Recounted 1 tags', out.getvalue())
+
+    def test_reindex_recipe_search(self):
+        """Test the reindex command updates every recipe in batches"""
+        user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        recipes = [Recipe.objects.create(user=user, title=title,
+                                         time_minutes=60, price=5.00)
+                   for title in ('githeri', 'ugali', 'pilau')]
+
+        out = StringIO()
+        with patch('recipe.search.is_supported', return_value=True), \
+                patch('recipe.search.update_search_vectors') as update:
+            call_command('reindex_recipe_search', batch_size=2, stdout=out)
+
+        self.assertEqual([list(call[0][0]) for call in update.call_args_list],
+                         [[recipes[0].id, recipes[1].id], [recipes[2].id]])
+        self.assertIn('Reindexed 3 recipes', out.getvalue())
+
+    def test_benchmark_recipe_filters(self):
+        """Test the recipe filter benchmark reports every strategy"""
+        out = StringIO()
+        call_command('benchmark', 'recipe_filters', recipes=20, tags=5,
+                     ingredients=5, repeat=1, stdout=out)
+        self.assertIn('all: having count', out.getvalue())
+
+    def test_benchmark_serializers(self):
+        """Test the serializer benchmark reports both code paths"""
+        out = StringIO()
+        call_command('benchmark', 'serializers', recipes=20, tags=5,
+                     ingredients=5, repeat=1, stdout=out)
+        self.assertIn('ms/1k', out.getvalue())
+
+    def test_benchmark_search(self):
+        """Test the search benchmark reports the substring fallback"""
+        out = StringIO()
+        call_command('benchmark', 'search', recipes=20, tags=5,
+                     ingredients=5, repeat=1, stdout=out)
+        self.assertIn('substring', out.getvalue())
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_benchmark_logins(self):
+        """Test the logins benchmark reports sign ins and API reads"""
+        out = StringIO()
+        call_command('benchmark', 'logins', recipes=20, tags=5,
+                     ingredients=5, seconds=0.2, sign_ins=2, stdout=out)
+        self.assertIn('sign ins', out.getvalue())
+        self.assertIn('api reads', out.getvalue())
+
+    def test_benchmark_connections(self):
+        """Test the connections benchmark needs postgresql"""
+        out = StringIO()
+        call_command('benchmark', 'connections', recipes=5, tags=2,
+                     ingredients=2, seconds=0.1, stdout=out)
+        if connection.vendor == 'postgresql':
+            self.assertIn('pooled', out.getvalue())
+        else:
+            self.assertIn('skipped', out.getvalue())
+
+
+class ImportRecipesTests(TestCase):
+    """Test importing recipes from csv and ndjson dumps"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
+
+    def test_import_csv(self):
+        """Test recipes, tags and ingredients are imported from csv"""
+        Tag.objects.create(user=self.user, name='vegan')
+        path = self._write('recipes.csv', (
+            'email,title,time_minutes,price,link,tags,ingredients\n'
+            'kangogo@baratel.com,githeri,60,5.00,,Vegan|kenyan,maize|beans\n'
+            'kangogo@baratel.com,ugali,20,1.50,,Kenyan,maize\n'
+            'kangogo@baratel.com,broken,soon,1.50,,,\n'
+        ))
+        out = StringIO()
+        err = StringIO()
+
+        call_command('import_recipes', path, stdout=out, stderr=err)
+
+        self.assertIn('Imported 2 recipes, skipped 1', out.getvalue())
+        self.assertIn('Skipping record 3', err.getvalue())
+        githeri = Recipe.objects.get(title='githeri')
+        self.assertEqual(githeri.user, self.user)
+        self.assertEqual(sorted(t.name for t in githeri.tags.all()),
+                         ['kenyan', 'vegan'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Tag.objects.get(name='kenyan').recipe_count, 2)
+        ugali = Recipe.objects.get(title='ugali')
+        self.assertEqual([i.name for i in ugali.ingredients.all()], ['maize'])
+
+    def test_import_ndjson_resumes_from_checkpoint(self):
+        """Test an import skips the records recorded in its checkpoint"""
+        path = self._write('recipes.ndjson', ''.join(
+            json.dumps({'title': f'recipe {i}', 'time_minutes': i,
+                        'price': '1.00', 'tags': ['quick']}) + '\n'
+            for i in range(5)
+        ))
+        ImportCheckpoint.objects.create(name='nightly',
+                                        path=os.path.abspath(path),
+                                        position=2)
+
+        call_command('import_recipes', path, user='kangogo@baratel.com',
+                     checkpoint='nightly', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['recipe 2', 'recipe 3', 'recipe 4']
+        )
+        self.assertEqual(ImportCheckpoint.objects.get().position, 5)
+        self.assertEqual(Recipe.tags.through.objects.count(), 3)
+
+    def test_import_checkpoint_rolled_back_with_batch(self):
+        """Test a failed batch leaves the checkpoint before it"""
+        path = self._write('recipes.ndjson', ''.join(
+            json.dumps({'title': f'recipe {i}', 'time_minutes': i,
+                        'price': '1.00'}) + '\n'
+            for i in range(4)
+        ))
+
+        # tags and ingredients of the first batch, then a crash
+        with patch('core.management.commands.import_recipes.Command.'
+                   '_insert_links',
+                   side_effect=[None, None, RuntimeError('crash')]):
+            with self.assertRaises(RuntimeError):
+                call_command('import_recipes', path,
+                             user='kangogo@baratel.com',
+                             checkpoint='nightly', batch_size=2,
+                             stdout=StringIO())
+
+        self.assertEqual(ImportCheckpoint.objects.get().position, 2)
+        self.assertEqual(Recipe.objects.count(), 2)
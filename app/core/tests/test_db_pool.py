@@ -0,0 +1,101 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool, PoolExhausted, release_connection
+
+
+class FakeConnection:
+    """stand in for a driver connection"""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """test the bounded pool of database connections"""
+
+    def _pool(self, **params):
+        options = {'max_size': 2, 'timeout': 0.05, 'check_after': 60}
+        options.update(params)
+        return ConnectionPool(FakeConnection,
+                              lambda connection: not connection.closed,
+                              **options)
+
+    def test_connection_reused(self):
+        """test a returned connection is handed out again"""
+        pool = self._pool()
+        connection = pool.get()
+        pool.put(connection)
+
+        self.assertIs(pool.get(), connection)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused']), (1, 1))
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_full_pool_times_out(self):
+        """test borrowers give up once the pool stays full"""
+        pool = self._pool()
+        pool.get()
+        pool.get()
+
+        with self.assertRaises(PoolExhausted):
+            pool.get()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_returned_connection(self):
+        """test a waiting borrower gets the next returned connection"""
+        pool = self._pool(max_size=1, timeout=5)
+        connection = pool.get()
+        borrowed = []
+        waiter = threading.Thread(target=lambda: borrowed.append(pool.get()))
+        waiter.start()
+
+        pool.put(connection)
+        waiter.join()
+
+        self.assertEqual(borrowed, [connection])
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_broken_idle_connection_replaced(self):
+        """test a connection failing its health check is replaced"""
+        pool = self._pool(check_after=0)
+        connection = pool.get()
+        connection.closed = True
+        pool.put(connection)
+
+        replacement = pool.get()
+
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_unusable_connection_frees_slot(self):
+        """test a connection returned as unusable is closed and forgotten"""
+        pool = self._pool(max_size=1)
+        connection = pool.get()
+
+        pool.put(connection, usable=False)
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.get(), connection)
+
+    def test_release_connection(self):
+        """test only a pooled connection outside a transaction goes back"""
+        with mock.patch('core.db.pool.default_connection') as connection:
+            connection.pooled = True
+            connection.in_atomic_block = True
+            release_connection()
+            connection.close.assert_not_called()
+
+            connection.in_atomic_block = False
+            release_connection()
+            connection.close.assert_called_once_with()
+
+            connection.pooled = False
+            release_connection()
+            connection.close.assert_called_once_with()
@@ -0,0 +1,110 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashing
+from user.throttling import get_store
+
+TOKEN_URL = reverse('user:token')
+ADMIN_LOGIN_URL = reverse('admin:login')
+
+
+class HashingPoolTests(TestCase):
+    """test password hashing is bounded"""
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=0)
+    def test_overload_rejected(self):
+        """test callers beyond the pool limit are turned away at once"""
+        admitted = threading.Event()
+        release = threading.Event()
+
+        def block():
+            admitted.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=hashing.run, args=(block,))
+        thread.start()
+        admitted.wait(5)
+        try:
+            with self.assertRaises(hashing.HashingOverloaded):
+                hashing.run(lambda: None)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(hashing.run(lambda: 'done'), 'done')
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=1)
+    def test_queued_caller_waits(self):
+        """test a queued caller hashes in its own thread once a slot frees"""
+        admitted = threading.Event()
+        release = threading.Event()
+        ran_in = []
+
+        def block():
+            admitted.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=hashing.run, args=(block,))
+        thread.start()
+        admitted.wait(5)
+        waiter = threading.Thread(
+            target=hashing.run,
+            args=(lambda: ran_in.append(threading.current_thread()),)
+        )
+        waiter.start()
+        waiter.join(0.2)
+        self.assertEqual(ran_in, [])
+        release.set()
+        thread.join()
+        waiter.join()
+        self.assertEqual(ran_in, [waiter])
+
+    def test_iterations_tunable(self):
+        """test the hasher follows PASSWORD_HASH_ITERATIONS"""
+        hasher = get_hasher('pbkdf2_sha256')
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            encoded = hasher.encode('password123', 'salt')
+            self.assertTrue(encoded.startswith('pbkdf2_sha256$1000$'))
+            self.assertTrue(hasher.verify('password123', encoded))
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertTrue(hasher.must_update(encoded))
+
+    def test_sign_in_overloaded(self):
+        """test an overloaded sign in answers 503 with Retry-After"""
+        get_store().clear()
+        get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        client = APIClient()
+
+        with patch('core.hashing.run', side_effect=hashing.HashingOverloaded):
+            res = client.post(TOKEN_URL, {
+                'email': 'kangogo@baratel.com',
+                'password': 'password123',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_admin_login_overloaded(self):
+        """test an overloaded admin sign in answers 503, not 500"""
+        get_user_model().objects.create_superuser(
+            'admin@baratel.com',
+            'password123'
+        )
+
+        with patch('core.hashing.run', side_effect=hashing.HashingOverloaded):
+            res = self.client.post(ADMIN_LOGIN_URL, {
+                'username': 'admin@baratel.com',
+                'password': 'password123',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
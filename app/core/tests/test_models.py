@@ -1,6 +1,8 @@
 
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models.signals import m2m_changed
 from unittest.mock import patch
 from .. import models
 
@@ -51,6 +53,78 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_names_unique_ignoring_case(self):
+        """test a user cannot have two tags differing only by case"""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name='Nyama')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Tag.objects.create(user=user, name='nyama')
+
+    def test_get_or_create_names(self):
+        """test names are created once and existing ones are reused"""
+        user = sample_user()
+        onion = models.Ingredient.objects.create(user=user, name='Onion')
+
+        found, created = models.Ingredient.objects.get_or_create_names(
+            user.pk, ['onion', 'Garlic', 'garlic']
+        )
+
+        self.assertEqual(found['onion'], onion)
+        self.assertEqual(created, {'garlic'})
+        self.assertEqual(models.Ingredient.objects.count(), 2)
+
+    def test_recipe_count_follows_links(self):
+        """test recipe_count is kept up to date as links change"""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        recipes = [models.Recipe.objects.create(
+            user=user, title=title, time_minutes=10, price=5.00
+        ) for title in ('githeri', 'ugali', 'chapati')]
+
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        recipes[0].tags.add(tag)
+        recipes[0].tags.remove(tag)
+        recipes[0].tags.remove(tag)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
+
+        tag.recipe_set.remove(recipes[1])
+        recipes[2].tags.clear()
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+
+        tag.recipe_set.add(*recipes)
+        recipes[0].delete()
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
+
+    def test_concurrent_removal_counted_once(self):
+        """test a link removed by two requests is only uncounted once"""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        recipe = models.Recipe.objects.create(
+            user=user, title='githeri', time_minutes=10, price=5.00
+        )
+        recipe.tags.add(tag)
+        through = models.Recipe.tags.through
+
+        def remove_first(sender, action, **kwargs):
+            # the other request removes the link after our snapshot
+            if action == 'pre_remove':
+                through.objects.filter(recipe_id=recipe.pk).delete()
+                models.Tag.objects.filter(pk=tag.pk).shift_recipe_count(-1)
+
+        m2m_changed.connect(remove_first, sender=through)
+        try:
+            recipe.tags.remove(tag)
+        finally:
+            m2m_changed.disconnect(remove_first, sender=through)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+
     def test_ingredients_str(self):
         """test ingrediens str representation"""
         ingredient = models.Ingredient.objects.create(
@@ -0,0 +1,124 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+
+from core.models import Recipe, StoredFile
+from core.storage import acquire, collect, image_storage, release
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def jpeg_bytes(colour='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), colour).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_WORKERS=0)
+class ContentAddressedStorageTests(TransactionTestCase):
+    """test images are stored once and deleted with their last recipe"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+
+    def _recipe(self, content=None, title='githeri'):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title=title,
+            time_minutes=60,
+            price=5.00
+        )
+        if content is not None:
+            recipe.image.save('photo.jpg', ContentFile(content))
+        return recipe
+
+    def test_same_content_same_name(self):
+        """test saving identical content twice keeps a single file"""
+        first = image_storage.save('uploads/recipe/a.jpg',
+                                   ContentFile(b'kachumbari'))
+        second = image_storage.save('uploads/recipe/b.JPG',
+                                    ContentFile(b'kachumbari'))
+
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith('.jpg'))
+        self.assertEqual(len(image_storage.listdir(
+            first.rsplit('/', 1)[0])[1]), 1)
+
+    def test_shared_image_counted(self):
+        """test recipes sharing an image share one reference counted file"""
+        data = jpeg_bytes()
+        first = self._recipe(data)
+        second = self._recipe(data, title='ugali')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).refs, 2
+        )
+
+    def test_orphan_deleted_with_last_recipe(self):
+        """test the file is only deleted with its last reference"""
+        data = jpeg_bytes()
+        first = self._recipe(data)
+        second = self._recipe(data, title='ugali')
+        name = first.image.name
+
+        first.delete()
+        self.assertTrue(image_storage.exists(name))
+
+        second.delete()
+        self.assertFalse(image_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_deleted(self):
+        """test replacing an image deletes the previous file"""
+        recipe = self._recipe(jpeg_bytes('red'))
+        name = recipe.image.name
+
+        recipe.image.save('photo.jpg', ContentFile(jpeg_bytes('blue')))
+
+        self.assertNotEqual(recipe.image.name, name)
+        self.assertFalse(image_storage.exists(name))
+        self.assertTrue(image_storage.exists(recipe.image.name))
+
+    def test_save_holds_reference_row(self):
+        """test a saved file has a row for collect to lock"""
+        with transaction.atomic():
+            name = image_storage.save('uploads/recipe/a.jpg',
+                                      ContentFile(b'kachumbari'))
+            self.assertEqual(StoredFile.objects.get(name=name).refs, 0)
+            acquire(name)
+
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+
+    def test_collected_content_saved_again(self):
+        """test content saved after its file was collected is written"""
+        with transaction.atomic():
+            name = image_storage.save('uploads/recipe/a.jpg',
+                                      ContentFile(b'kachumbari'))
+            acquire(name)
+        release(name)
+        self.assertFalse(image_storage.exists(name))
+
+        with transaction.atomic():
+            again = image_storage.save('uploads/recipe/b.jpg',
+                                       ContentFile(b'kachumbari'))
+            acquire(again)
+        collect(again)
+
+        self.assertEqual(again, name)
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        """connect the cache invalidation signals"""
+        from . import signals  # noqa
+        from .cache import check_shared_cache
+        check_shared_cache()
@@ -0,0 +1,219 @@
+from django.db import connection, IntegrityError, transaction
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+
+def insert_objects(model, objs, batch_size=500):
+    """insert objs in batches and make sure they end up with their pks"""
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objs, batch_size=batch_size)
+    else:
+        for obj in objs:
+            obj.save(force_insert=True)
+    return objs
+
+
+def _to_id(value):
+    """return value as an id, or None when it is not one"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkMixin:
+    """create, update and delete many objects in one request
+
+    every item is validated first; if any item fails nothing is written
+    and the errors are returned in a list matching the submitted items
+    """
+    bulk_max_items = 1000
+    # m2m field name -> related model, resolved with one query per field
+    bulk_relations = {}
+
+    def get_bulk_serializer(self, *args, **kwargs):
+        """return the serializer used to validate a single item"""
+        kwargs.setdefault('context', self.get_serializer_context())
+        return self.bulk_serializer_class(*args, **kwargs)
+
+    def _bulk_items(self, data):
+        """check the payload is a list of a reasonable size"""
+        if not isinstance(data, list) or not data:
+            return None, _('Expected a non empty list of items.')
+        if len(data) > self.bulk_max_items:
+            return None, _('Expected at most {count} items.').format(
+                count=self.bulk_max_items
+            )
+        return data, None
+
+    def _resolve_relations(self, validated, errors):
+        """check every related id belongs to the user, one query per field"""
+        for field, model in self.bulk_relations.items():
+            ids = {pk for data in validated if data
+                   for pk in data.get(field, ())}
+            if not ids:
+                continue
+            owned = set(model.objects.filter(
+                user=self.request.user, id__in=ids
+            ).values_list('id', flat=True))
+            for data, error in zip(validated, errors):
+                missing = [pk for pk in data.get(field, ()) if pk not in owned]
+                if data and missing:
+                    error[field] = [
+                        _('Invalid pk "{pk_value}" - object does not exist.')
+                        .format(pk_value=pk) for pk in missing
+                    ]
+
+    def _save_relations(self, objs, validated, replace=False):
+        """write the m2m rows of objs with one insert per field"""
+        for field in self.bulk_relations:
+            m2m = self.queryset.model._meta.get_field(field)
+            through = m2m.remote_field.through
+            source = f'{m2m.m2m_field_name()}_id'
+            target = f'{m2m.m2m_reverse_field_name()}_id'
+            changed = [(obj, data[field]) for obj, data in zip(objs, validated)
+                       if field in data]
+            counted = {pk for _obj, ids in changed for pk in ids}
+            if replace and changed:
+                old = through.objects.filter(**{
+                    f'{source}__in': [obj.pk for obj, _ids in changed]
+                })
+                counted.update(old.values_list(target, flat=True))
+                old.delete()
+            through.objects.bulk_create([
+                through(**{source: obj.pk, target: pk})
+                for obj, ids in changed for pk in set(ids)
+            ])
+            # the raw m2m writes send no signals to keep the counters
+            if counted:
+                m2m.related_model.objects.filter(
+                    pk__in=counted
+                ).recount_recipes()
+
+    def bulk_written(self, objs):
+        """hook called after objs were created or updated in bulk"""
+
+    def get_bulk_queryset(self):
+        """return the queryset used to serialize written objects"""
+        return self.queryset.filter(user=self.request.user)
+
+    def _bulk_response(self, objs, status_code):
+        """serialize the written objects with prefetched relations"""
+        queryset = self.get_bulk_queryset().filter(
+            id__in=[obj.pk for obj in objs]
+        )
+        by_id = {obj.pk: obj for obj in queryset}
+        serializer = self.get_serializer(
+            [by_id[obj.pk] for obj in objs], many=True
+        )
+        return Response(serializer.data, status=status_code)
+
+    def _bulk_validate(self, items, instances=None):
+        """validate every item and return the data and aligned errors"""
+        validated = []
+        errors = []
+        for index, item in enumerate(items):
+            instance = instances[index] if instances else None
+            if instances is not None and instance is None:
+                validated.append({})
+                errors.append({'id': [_('Not found.')]})
+                continue
+            serializer = self.get_bulk_serializer(
+                instance, data=item, partial=instance is not None
+            )
+            if serializer.is_valid():
+                validated.append(serializer.validated_data)
+                errors.append({})
+            else:
+                validated.append({})
+                errors.append(dict(serializer.errors))
+        self._resolve_relations(validated, errors)
+        return validated, errors
+
+    def _owned_instances(self, ids):
+        """fetch the user's objects for the given ids in one query"""
+        found = self.queryset.model.objects.filter(
+            user=self.request.user,
+            id__in=[pk for pk in ids if pk is not None]
+        ).in_bulk()
+        return [found.get(pk) for pk in ids]
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False,
+            url_path='bulk')
+    def bulk(self, request):
+        """create, update or delete a list of objects in one transaction"""
+        items, error = self._bulk_items(request.data)
+        if error:
+            return Response({'non_field_errors': [error]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'POST':
+            return self.bulk_create(items)
+        if request.method == 'PATCH':
+            return self.bulk_update(items)
+        return self.bulk_destroy(items)
+
+    def bulk_create(self, items):
+        """create all the items"""
+        validated, errors = self._bulk_validate(items)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.queryset.model
+        with transaction.atomic():
+            objs = insert_objects(model, [
+                model(user=self.request.user, **{
+                    name: value for name, value in data.items()
+                    if name not in self.bulk_relations
+                }) for data in validated
+            ])
+            self._save_relations(objs, validated)
+            self.bulk_written(objs)
+        self.invalidate_list_cache()
+        return self._bulk_response(objs, status.HTTP_201_CREATED)
+
+    def bulk_update(self, items):
+        """apply a partial update to every item, looked up by its id"""
+        ids = [_to_id(item.get('id')) if isinstance(item, dict) else None
+               for item in items]
+        instances = self._owned_instances(ids)
+        validated, errors = self._bulk_validate(items, instances)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        auto_now = [field.name for field in
+                    self.queryset.model._meta.concrete_fields
+                    if getattr(field, 'auto_now', False)]
+        try:
+            with transaction.atomic():
+                for instance, data in zip(instances, validated):
+                    fields = [name for name in data
+                              if name not in self.bulk_relations]
+                    for name in fields:
+                        setattr(instance, name, data[name])
+                    if fields or auto_now:
+                        instance.save(update_fields=fields + auto_now)
+                self._save_relations(instances, validated, replace=True)
+                self.bulk_written(instances)
+        except IntegrityError:
+            return Response({'non_field_errors': [
+                _('The changes conflict with existing objects.')
+            ]}, status=status.HTTP_400_BAD_REQUEST)
+        self.invalidate_list_cache()
+        return self._bulk_response(instances, status.HTTP_200_OK)
+
+    def bulk_destroy(self, ids):
+        """delete all the objects with the given ids"""
+        instances = self._owned_instances([_to_id(pk) for pk in ids])
+        errors = [{} if instance else {'id': [_('Not found.')]}
+                  for instance in instances]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            self.queryset.model.objects.filter(
+                id__in=[instance.pk for instance in instances]
+            ).delete()
+        self.invalidate_list_cache()
+        return Response(status=status.HTTP_204_NO_CONTENT)
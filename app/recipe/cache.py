@@ -0,0 +1,323 @@
+import hashlib
+import pickle
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.http import http_date, parse_etags, \
+    parse_http_date_safe, quote_etag
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class CacheStats:
+    """thread safe hit and miss counters for the list cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """set all counters back to zero"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record(self, hit):
+        """count one cache lookup"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        """return the current counters"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    """return the cache backing the list responses"""
+    return caches[settings.RECIPE_LIST_CACHE]
+
+
+# backends that keep a separate copy of the generations in each process
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_shared_cache():
+    """refuse a list cache the worker processes do not share
+
+    a write only bumps the generation in the cache it goes through, so
+    with a process local cache the other processes keep serving their
+    cached lists and etags; that is only allowed with DEBUG on
+    """
+    backend = settings.CACHES[settings.RECIPE_LIST_CACHE]['BACKEND']
+    if backend in PROCESS_LOCAL_BACKENDS and not settings.DEBUG:
+        raise ImproperlyConfigured(
+            f'The {settings.RECIPE_LIST_CACHE!r} cache must be shared by '
+            f'every process, set RECIPE_CACHE_BACKEND to a shared backend '
+            f'instead of {backend}.'
+        )
+
+
+def _generation_key(user_id):
+    return f'recipe:generation:{user_id}'
+
+
+def _new_generation():
+    # a clock based start value never repeats a generation that was
+    # evicted together with the counter
+    return int(time.time() * 1000000)
+
+
+def get_generation(user_id):
+    """return the current version stamp of a user's recipe data"""
+    cache = get_cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """invalidate every cached list response of a user"""
+    cache = get_cache()
+    key = _generation_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _new_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def bump_generation_on_commit(user_id):
+    """invalidate a user's cached lists for a write, now and on commit
+
+    a list read while the write's transaction is open still sees the old
+    rows and may cache them under the generation bumped so far, so the
+    generation is bumped again once the write is visible
+    """
+    bump_generation(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_generation(user_id))
+
+
+def request_generation(request):
+    """return the generation of the requesting user, once per request"""
+    generation = getattr(request, '_recipe_generation', None)
+    if generation is None:
+        generation = get_generation(request.user.pk)
+        request._recipe_generation = generation
+    return generation
+
+
+def list_cache_key(request, generation):
+    """build the cache key of a list request"""
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    digest = hashlib.sha1(
+        repr((request.path, params)).encode('utf-8')
+    ).hexdigest()
+    return f'recipe:list:{request.user.pk}:{generation}:{digest}'
+
+
+class CachedListMixin:
+    """cache list responses per user until the user writes again"""
+    cached_headers = ('Link',)
+
+    def list(self, request, *args, **kwargs):
+        """return the cached list response if there is one"""
+        cache = get_cache()
+        key = list_cache_key(request, request_generation(request))
+        cached = cache.get(key)
+        stats.record(cached is not None)
+        if cached is not None:
+            data, headers = cached
+            response = Response(data, headers=headers)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        headers = {name: response[name] for name in self.cached_headers
+                   if response.has_header(name)}
+        cache.set(key, (response.data, headers))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def invalidate_list_cache(self):
+        """drop the cached lists of the requesting user"""
+        bump_generation_on_commit(self.request.user.pk)
+
+
+def request_etag(request):
+    """return the strong etag of a read request
+
+    it only depends on the user's generation and the request, so it can
+    be checked before any query runs; the generation lives in the shared
+    list cache, so every process sees a write made by any of them
+    """
+    key = list_cache_key(request, request_generation(request))
+    return quote_etag(hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def etag_matches(request, etag, wildcard=True):
+    """return whether If-None-Match matches the etag
+
+    `*` only counts with wildcard, for callers that know a current
+    representation exists
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags and wildcard:
+        return True
+    return etag.strip('"') in (tag.replace('W/', '', 1).strip('"')
+                               for tag in etags)
+
+
+def not_modified(etag, last_modified=None):
+    """return an empty 304 response"""
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalGetMixin:
+    """answer conditional reads with 304 before serializing anything"""
+    last_modified_field = 'updated_at'
+
+    def list(self, request, *args, **kwargs):
+        """list objects unless the client copy is still current"""
+        etag = request_etag(request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def _last_modified(self):
+        """return the last modification time without loading the object"""
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        return self.get_queryset().filter(
+            **{self.lookup_field: self.kwargs[lookup]}
+        ).values_list(self.last_modified_field, flat=True).first()
+
+    def retrieve(self, request, *args, **kwargs):
+        """retrieve an object unless the client copy is still current"""
+        etag = request_etag(request)
+        if etag_matches(request, etag, wildcard=False):
+            return not_modified(etag)
+        # `*` must not answer for objects missing from the user's queryset
+        if etag_matches(request, etag) and self._last_modified() is not None:
+            return not_modified(etag)
+
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        if since is not None and 'HTTP_IF_NONE_MATCH' not in request.META:
+            modified = self._last_modified()
+            if modified is not None and int(modified.timestamp()) <= since:
+                return not_modified(etag, modified)
+
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        modified = getattr(instance, self.last_modified_field)
+        response['Last-Modified'] = http_date(modified.timestamp())
+        return response
+
+
+class RedisCache(BaseCache):
+    """minimal cache backend for redis compatible servers
+
+    the client is built by the callable named in the CLIENT_FACTORY
+    option, which receives the location; it defaults to redis-py
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server
+        self._factory = params.get('OPTIONS', {}).get(
+            'CLIENT_FACTORY', 'redis.Redis.from_url'
+        )
+        self._client = None
+
+    @property
+    def client(self):
+        """return the lazily created redis client"""
+        if self._client is None:
+            self._client = import_string(self._factory)(self._server)
+        return self._client
+
+    def _timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return None
+        return max(int(timeout), 1)
+
+    def _dumps(self, value):
+        # integers are stored as is so that INCRBY works on them
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode('ascii')
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _loads(self, value):
+        if value[:1] == b'\x80':
+            return pickle.loads(value)
+        return int(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self.client.set(self._key(key, version),
+                                    self._dumps(value),
+                                    ex=self._timeout(timeout), nx=True))
+
+    def get(self, key, default=None, version=None):
+        value = self.client.get(self._key(key, version))
+        if value is None:
+            return default
+        return self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.client.set(self._key(key, version), self._dumps(value),
+                        ex=self._timeout(timeout))
+
+    def delete(self, key, version=None):
+        self.client.delete(self._key(key, version))
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self.client.exists(key):
+            raise ValueError(f"Key '{key}' not found")
+        return self.client.incrby(key, delta)
+
+    def clear(self):
+        self.client.flushdb()
@@ -0,0 +1,58 @@
+import json
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def iter_chunks(iterable, size):
+    """yield lists of up to size items from iterable"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_records(queryset, row_serializer, chunk_size):
+    """yield serialized objects, reading the queryset in chunks
+
+    rows are read through a server side cursor where the database
+    supports it, and the related ids are fetched once per chunk
+    """
+    rows = row_serializer.rows(queryset).iterator(chunk_size=chunk_size)
+    for chunk in iter_chunks(rows, chunk_size):
+        yield from row_serializer.to_representation(queryset.model, chunk)
+
+
+def _dumps(record):
+    return json.dumps(record, cls=JSONEncoder, ensure_ascii=False,
+                      separators=(',', ':'))
+
+
+def ndjson_lines(records):
+    """encode records as newline delimited json"""
+    for record in records:
+        yield (_dumps(record) + '\n').encode('utf-8')
+
+
+def json_array(records):
+    """encode records as a json array without holding it in memory"""
+    yield b'['
+    separator = b''
+    for record in records:
+        yield separator + _dumps(record).encode('utf-8')
+        separator = b',\n'
+    yield b']\n'
+
+
+def gzipped(chunks, level=6):
+    """gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,139 @@
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import IntegerField, OuterRef, Subquery
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+class ArraySubquery(Subquery):
+    """collect the values of a one column subquery into a postgres array"""
+    template = 'ARRAY(%(subquery)s)'
+
+
+# fields whose to_representation leaves database values unchanged
+_PASSTHROUGH = (serializers.IntegerField, serializers.CharField)
+
+
+def m2m_columns(model, relation):
+    """return the through model and its source and target columns"""
+    field = model._meta.get_field(relation)
+    return (field.remote_field.through,
+            f'{field.m2m_field_name()}_id',
+            f'{field.m2m_reverse_field_name()}_id')
+
+
+class RowSerializer:
+    """serialize `.values()` rows exactly like a ModelSerializer would
+
+    plain columns are read from the row dicts (by field source) and m2m
+    fields from lists of related ids, so no model instance is ever built
+    """
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        self.relations = []
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            if isinstance(field, serializers.ManyRelatedField):
+                self.relations.append(name)
+                self.converters.append((name, name, None))
+            else:
+                if field.source not in self.columns:
+                    self.columns.append(field.source)
+                convert = (None if type(field) in _PASSTHROUGH
+                           else field.to_representation)
+                self.converters.append((name, field.source, convert))
+
+    def rows(self, queryset, extra=()):
+        """return the `.values()` queryset to serialize
+
+        on postgres the related ids come back as ordered arrays in the
+        same query, elsewhere they are fetched in to_representation;
+        extra columns (such as the pagination ordering) are selected too
+        """
+        queryset = queryset.prefetch_related(None)
+        columns = self.columns + [name for name in extra
+                                  if name not in self.columns]
+        if connection.vendor != 'postgresql' or not self.relations:
+            return queryset.values(*columns)
+
+        from django.contrib.postgres.fields import ArrayField
+        arrays = {}
+        for relation in self.relations:
+            through, source, target = m2m_columns(queryset.model, relation)
+            arrays[f'{relation}_ids'] = ArraySubquery(
+                through.objects.filter(
+                    **{source: OuterRef('pk')}
+                ).order_by(target).values(target),
+                output_field=ArrayField(IntegerField())
+            )
+        return queryset.annotate(**arrays).values(*columns, *arrays)
+
+    def _related_ids(self, model, rows):
+        """return {relation: {pk: [related ids]}} for the rows"""
+        related = {}
+        for relation in self.relations:
+            key = f'{relation}_ids'
+            if rows and key in rows[0]:
+                related[relation] = {row['id']: row[key] for row in rows}
+                continue
+            through, source, target = m2m_columns(model, relation)
+            ids = defaultdict(list)
+            links = through.objects.filter(
+                **{f'{source}__in': [row['id'] for row in rows]}
+            ).order_by(target).values_list(source, target)
+            for pk, related_id in links:
+                ids[pk].append(related_id)
+            related[relation] = ids
+        return related
+
+    def to_representation(self, model, rows):
+        """return the serialized rows"""
+        rows = list(rows)
+        related = self._related_ids(model, rows)
+        data = []
+        for row in rows:
+            item = OrderedDict()
+            for name, source, convert in self.converters:
+                if name in related:
+                    item[name] = list(related[name].get(row['id']) or ())
+                elif convert is None or row[source] is None:
+                    item[name] = row[source]
+                else:
+                    item[name] = convert(row[source])
+            data.append(item)
+        return data
+
+
+_row_serializers = {}
+
+
+def get_row_serializer(serializer_class):
+    """return the shared row serializer of a serializer class"""
+    if serializer_class not in _row_serializers:
+        _row_serializers[serializer_class] = RowSerializer(serializer_class)
+    return _row_serializers[serializer_class]
+
+
+class FastListMixin:
+    """serve list responses from `.values()` rows when enabled"""
+
+    def list(self, request, *args, **kwargs):
+        """list objects without instantiating models"""
+        if not settings.RECIPE_FAST_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        row_serializer = get_row_serializer(self.get_serializer_class())
+        ordering = getattr(self, 'pagination_ordering', None) or ()
+        rows = row_serializer.rows(
+            queryset, extra=[name.lstrip('-') for name in ordering]
+        )
+        page = self.paginate_queryset(rows)
+        data = row_serializer.to_representation(
+            queryset.model, rows if page is None else page
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
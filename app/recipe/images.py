@@ -0,0 +1,244 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, features
+
+from core.models import Recipe, recipe_image_file_path
+from core.storage import acquire, image_storage, release
+from .cache import bump_generation
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = 'uploads/recipe/renditions'
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+_ORIENTATION_TAG = 0x0112
+_TRANSPOSE = {
+    2: (Image.FLIP_LEFT_RIGHT,),
+    3: (Image.ROTATE_180,),
+    4: (Image.FLIP_TOP_BOTTOM,),
+    5: (Image.ROTATE_90, Image.FLIP_TOP_BOTTOM),
+    6: (Image.ROTATE_270,),
+    7: (Image.ROTATE_270, Image.FLIP_TOP_BOTTOM),
+    8: (Image.ROTATE_90,),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """return the shared pool processing uploaded images"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-image'
+            )
+        return _executor
+
+
+def output_format():
+    """return the pillow format and extension processed images use"""
+    if settings.RECIPE_IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def rendition_name(digest, width, ext):
+    """return the storage name of a rendition
+
+    the name only depends on the content of the source image, so a
+    rendition never changes once written and can be cached forever
+    """
+    return f'{RENDITION_DIR}/{digest[:2]}/{digest}-{width}.{ext}'
+
+
+def rendition_url(digest, width, ext):
+    """return the url serving a rendition"""
+    return reverse('recipe:image-rendition', kwargs={
+        'digest': digest, 'width': width, 'ext': ext
+    })
+
+
+def srcset(digest):
+    """return {width: url} for every rendition width of an image"""
+    if not digest:
+        return None
+    _fmt, ext = output_format()
+    return {str(width): rendition_url(digest, width, ext)
+            for width in settings.RECIPE_IMAGE_WIDTHS}
+
+
+def discard_renditions(digest):
+    """delete every rendition of an image"""
+    for ext in FORMATS:
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            default_storage.delete(rendition_name(digest, width, ext))
+
+
+def schedule(recipe_id, name):
+    """process an uploaded image once the upload is committed
+
+    with no workers configured the image is processed right away
+    """
+    if not settings.RECIPE_IMAGE_WORKERS:
+        process(recipe_id, name)
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(process, recipe_id, name)
+    )
+
+
+def stuck(minutes):
+    """return (recipe id, image name) of images left unprocessed
+
+    processing is only queued in the memory of a process, so a worker
+    stopping between an upload and its processing leaves the image
+    pending or processing until it is processed again
+    """
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    return Recipe.objects.filter(
+        image_status__in=(Recipe.IMAGE_PENDING, Recipe.IMAGE_PROCESSING),
+        updated_at__lt=cutoff
+    ).exclude(image='').values_list('id', 'image').order_by('id')
+
+
+def _orient(image):
+    """apply the exif orientation to the pixels, since exif is dropped"""
+    try:
+        orientation = (image._getexif() or {}).get(_ORIENTATION_TAG)
+    except (AttributeError, KeyError, IndexError, TypeError):
+        orientation = None
+    for method in _TRANSPOSE.get(orientation, ()):
+        image = image.transpose(method)
+    return image
+
+
+def _convert(image, fmt):
+    """return image in a mode fmt can store"""
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        return image.convert('RGB')
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA')
+    return image
+
+
+def _encode(image, fmt, width=None, height=None):
+    """return the bytes of image shrunk to fit the box, without metadata"""
+    image = _convert(image.copy(), fmt)
+    if width:
+        image.thumbnail((width, height or image.height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def render(source):
+    """decode an upload and return its extension and re-encoded bytes"""
+    fmt, ext = output_format()
+    image = Image.open(source)
+    image.load()
+    image = _orient(image)
+    size = settings.RECIPE_IMAGE_MAX_SIZE
+    return ext, _encode(image, fmt, size, size)
+
+
+def _save_once(name, data):
+    """write data under name unless a concurrent writer already did"""
+    if default_storage.exists(name):
+        return
+    saved = default_storage.save(name, ContentFile(data))
+    if saved != name:
+        default_storage.delete(saved)
+
+
+def make_rendition(image, digest, width, ext):
+    """write the width rendition of an opened image, returning its name"""
+    name = rendition_name(digest, width, ext)
+    if not default_storage.exists(name):
+        _save_once(name, _encode(image, FORMATS[ext], width))
+    return name
+
+
+def get_rendition(digest, width, ext):
+    """return the name of a rendition, rendering it on demand
+
+    returns None when no recipe has an image with that digest
+    """
+    name = rendition_name(digest, width, ext)
+    if default_storage.exists(name):
+        return name
+    source = Recipe.objects.filter(
+        image_hash=digest
+    ).values_list('image', flat=True).first()
+    if not source:
+        return None
+    with image_storage.open(source) as handle:
+        image = Image.open(handle)
+        image.load()
+    return make_rendition(image, digest, width, ext)
+
+
+def _set_status(recipe_id, name, status, **fields):
+    """update the recipe only if name is still its image"""
+    return Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_status=status, updated_at=timezone.now(), **fields
+    )
+
+
+def process(recipe_id, name):
+    """re-encode the image of a recipe and render its renditions"""
+    try:
+        if not _set_status(recipe_id, name, Recipe.IMAGE_PROCESSING):
+            return
+        processed = None
+        try:
+            with image_storage.open(name) as source:
+                ext, data = render(source)
+            digest = hashlib.sha256(data).hexdigest()
+            # held by this worker until the recipe takes it over
+            with transaction.atomic():
+                processed = image_storage.save(
+                    recipe_image_file_path(None, f'image.{ext}'),
+                    ContentFile(data)
+                )
+                acquire(processed)
+            if settings.RECIPE_IMAGE_PRERENDER:
+                image = Image.open(io.BytesIO(data))
+                for width in settings.RECIPE_IMAGE_WIDTHS:
+                    make_rendition(image, digest, width, ext)
+        except Exception:
+            logger.exception('Could not process image %s', name)
+            release(processed)
+            _set_status(recipe_id, name, Recipe.IMAGE_FAILED)
+        else:
+            # the update waits for any request holding the row, so the
+            # raw file is only released if nothing wrote it back
+            with transaction.atomic():
+                if _set_status(recipe_id, name, Recipe.IMAGE_READY,
+                               image=processed, image_hash=digest):
+                    release(name)
+                else:
+                    # replaced by a newer upload while we were working
+                    release(processed)
+        user_id = Recipe.objects.filter(pk=recipe_id).values_list(
+            'user_id', flat=True
+        ).first()
+        if user_id is not None:
+            bump_generation(user_id)
+    finally:
+        if settings.RECIPE_IMAGE_WORKERS:
+            connection.close()
@@ -0,0 +1,44 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class LinkHeaderCursorPagination(CursorPagination):
+    """keyset pagination that keeps the response body a plain list
+
+    the next and previous page urls are sent in a `Link` header so
+    existing clients that expect a list keep working
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        """use the ordering the view picked for this request, if any"""
+        return getattr(view, 'pagination_ordering', None) or self.ordering
+
+    def get_link_header(self):
+        """build the link header value for the current page"""
+        links = []
+        for rel, url in (('next', self.get_next_link()),
+                         ('prev', self.get_previous_link())):
+            if url is not None:
+                links.append(f'<{url}>; rel="{rel}"')
+        return ', '.join(links)
+
+    def get_paginated_response(self, data):
+        """return the page as a list with pagination links in headers"""
+        headers = {}
+        link = self.get_link_header()
+        if link:
+            headers['Link'] = link
+        return Response(data, headers=headers)
+
+
+class RecipePagination(LinkHeaderCursorPagination):
+    """paginate recipes newest first"""
+    ordering = ('-id',)
+
+
+class RecipeAttrPagination(LinkHeaderCursorPagination):
+    """paginate tags and ingredients by name"""
+    ordering = ('-name', 'id')
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+
+from core.models import Tag, Ingredient, Recipe
+
+# title, tag names and ingredient names weighted A, B and C
+_UPDATE_SQL = '''
+UPDATE {recipe} AS r SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, r.title), 'A') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(t.name, ' ') FROM {tag} t
+        JOIN {recipe_tags} rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = r.id
+    ), '')), 'B') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(i.name, ' ') FROM {ingredient} i
+        JOIN {recipe_ingredients} ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = r.id
+    ), '')), 'C')
+'''
+
+
+def is_supported():
+    """return whether the database keeps search vectors"""
+    return connection.vendor == 'postgresql'
+
+
+def _update_sql():
+    return _UPDATE_SQL.format(
+        recipe=Recipe._meta.db_table,
+        tag=Tag._meta.db_table,
+        ingredient=Ingredient._meta.db_table,
+        recipe_tags=Recipe.tags.through._meta.db_table,
+        recipe_ingredients=Recipe.ingredients.through._meta.db_table,
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """recompute the stored search vector of the given recipes
+
+    every recipe is updated when recipe_ids is None
+    """
+    if not is_supported():
+        return
+    params = {'config': settings.RECIPE_SEARCH_CONFIG}
+    sql = _update_sql()
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        sql += ' WHERE r.id = ANY(%(ids)s)'
+        params['ids'] = recipe_ids
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def linked_recipe_ids(instance):
+    """return the ids of the recipes using a tag or ingredient"""
+    relation = Recipe._meta.get_field(
+        'tags' if isinstance(instance, Tag) else 'ingredients'
+    )
+    through = relation.remote_field.through
+    return list(through.objects.filter(**{
+        f'{relation.m2m_reverse_field_name()}_id': instance.pk
+    }).values_list('recipe_id', flat=True))
+
+
+def _contains(relation, word):
+    """recipes linked to a tag or ingredient whose name contains word"""
+    model = Tag if relation == 'tags' else Ingredient
+    column = Recipe._meta.get_field(relation).m2m_reverse_field_name()
+    links = getattr(Recipe, relation).through.objects.filter(
+        recipe_id=OuterRef('pk'),
+        **{f'{column}__in': model.objects.filter(name__icontains=word)
+           .values('id')}
+    )
+    return Exists(links)
+
+
+def ranked_search(queryset, text):
+    """filter recipes on their stored search vector, best matches first"""
+    query = SearchQuery(text, config=settings.RECIPE_SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ), ('-rank', '-id')
+
+
+def substring_search(queryset, text):
+    """filter recipes matching every word anywhere, newest first"""
+    for index, word in enumerate(text.split()):
+        tags, ingredients = f'tag_{index}', f'ingredient_{index}'
+        queryset = queryset.annotate(**{
+            tags: _contains('tags', word),
+            ingredients: _contains('ingredients', word),
+        }).filter(
+            Q(title__icontains=word) | Q(**{tags: True}) |
+            Q(**{ingredients: True})
+        )
+    return queryset, ('-id',)
+
+
+def search(queryset, text):
+    """filter recipes matching a search
+
+    returns the queryset and the ordering its results come in; databases
+    without search vectors fall back to substring matching
+    """
+    if is_supported():
+        return ranked_search(queryset, text)
+    return substring_search(queryset, text)
@@ -1,5 +1,68 @@
+from django.conf import settings
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core.models import Tag, Ingredient, Recipe, ImageUpload
+from .images import srcset
+
+
+class OwnedManyRelatedField(serializers.ManyRelatedField):
+    """resolve a list of primary keys with a single query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        ids = []
+        for item in data:
+            if isinstance(item, bool):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                ids.append(int(item))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        found = child.get_queryset().in_bulk(ids)
+        missing = [pk for pk in dict.fromkeys(ids) if pk not in found]
+        if missing:
+            raise serializers.ValidationError([
+                child.error_messages['does_not_exist'].format(pk_value=pk)
+                for pk in missing
+            ])
+        return [found[pk] for pk in dict.fromkeys(ids)]
+
+
+class OwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """primary key field limited to objects of the requesting user"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return OwnedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(user=request.user)
+
+
+class SrcsetField(serializers.Field):
+    """map the rendition widths of the recipe image to their urls"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image_hash')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return srcset(value)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -18,22 +81,68 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class TagCountSerializer(TagSerializer):
+    """serializer for tag object with its number of recipes"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recipe_count',)
+
+
+class IngredientCountSerializer(IngredientSerializer):
+    """serializer for ingredient object with its number of recipes"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('recipe_count',)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """serializer for the recipe object"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = OwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = OwnedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
+    srcset = SrcsetField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'title', 'ingredients', 'time_minutes',
-                  'price', 'link')
-        read_only_fields = ('id',)
+                  'price', 'link', 'image_status', 'srcset')
+        read_only_fields = ('id', 'image_status')
+
+    def update(self, instance, validated_data):
+        """write only the submitted columns
+
+        image workers update the image columns of recipes a request may
+        already hold, a full save would put their old values back
+        """
+        relations = {name: validated_data.pop(name)
+                     for name in ('tags', 'ingredients')
+                     if name in validated_data}
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        instance.save(update_fields=list(validated_data) + ['updated_at'])
+        for name, value in relations.items():
+            getattr(instance, name).set(value)
+        return instance
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """validate one item of a bulk request
+
+    related ids are only parsed here and checked for all items at once
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -46,10 +155,30 @@ class RecipeImageSerializer(serializers.ModelSerializer):
     """serializer for uploading images to recipe"""
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id',)
-
-
+        fields = ('id', 'image', 'image_status')
+        read_only_fields = ('id', 'image_status')
 
 
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """serializer for starting a resumable image upload"""
+    size = serializers.IntegerField(min_value=1)
 
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'size', 'offset', 'sha256')
+        read_only_fields = ('id', 'offset')
+
+    def validate_size(self, value):
+        if value > settings.RECIPE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Uploads are limited to {settings.RECIPE_UPLOAD_MAX_SIZE} '
+                f'bytes.'
+            )
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or
+                      value.strip('0123456789abcdef')):
+            raise serializers.ValidationError('Expected a hex sha256 digest.')
+        return value
@@ -0,0 +1,223 @@
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, \
+    post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Tag, Ingredient, Recipe, ImageUpload
+from core.storage import acquire, file_orphaned, release
+from . import images, search, uploads
+from .cache import bump_generation_on_commit
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reset_user_generation(sender, instance, created, **kwargs):
+    """start new users on a fresh cache generation
+
+    a recycled user id must never see lists cached for its previous owner
+    """
+    if created:
+        bump_generation_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def bump_owner_generation(sender, instance, **kwargs):
+    """invalidate the owner's cached lists and etags on any write"""
+    bump_generation_on_commit(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    """mark recipes modified when their tags or ingredients change"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        recipes = Recipe.objects.filter(pk__in=pk_set or ())
+    else:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    recipes.update(updated_at=timezone.now())
+    bump_generation_on_commit(instance.user_id)
+
+
+@receiver(post_delete, sender=ImageUpload)
+def remove_upload_file(sender, instance, **kwargs):
+    """delete the partial file of a finished or abandoned upload"""
+    uploads.forget(instance)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    """remember the stored image to notice when a save replaces it
+
+    None means the field was deferred and the image is left alone
+    """
+    if 'image' not in instance.__dict__:
+        instance._stored_image = None
+        return
+    value = instance.__dict__['image']
+    instance._stored_image = getattr(value, 'name', value) or ''
+
+
+@receiver(pre_save, sender=Recipe)
+def reread_stored_image(sender, instance, update_fields=None, **kwargs):
+    """count the image reference against the row, not the loaded copy
+
+    an image worker may have replaced the image since the instance was
+    loaded and already released the old file; an instance keeping its
+    loaded image takes the current one instead of writing the old one
+    back. the row is locked when saving inside a transaction
+    """
+    if instance._stored_image is None or instance.pk is None:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    rows = Recipe.objects.filter(pk=instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        rows = rows.select_for_update()
+    current = rows.values('image', 'image_status', 'image_hash').first()
+    if current is None:
+        return
+    if (instance.image.name or '') == instance._stored_image:
+        instance.image = current['image']
+        instance.image_status = current['image_status']
+        instance.image_hash = current['image_hash']
+    instance._stored_image = current['image'] or ''
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, **kwargs):
+    """move the image reference when a recipe changes its image"""
+    if instance._stored_image is None:
+        return
+    name = instance.image.name or ''
+    if name != instance._stored_image:
+        acquire(name)
+        release(instance._stored_image)
+        instance._stored_image = name
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image(sender, instance, **kwargs):
+    """drop the image reference of a deleted recipe"""
+    release(instance._stored_image)
+
+
+@receiver(file_orphaned)
+def remove_renditions(sender, name, **kwargs):
+    """delete the renditions of an image file nothing uses anymore"""
+    digest = os.path.splitext(os.path.basename(name))[0]
+    images.discard_renditions(digest)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(sender, instance, update_fields=None, **kwargs):
+    """refresh the search vector when the title may have changed"""
+    if update_fields is None or 'title' in update_fields:
+        search.update_search_vectors([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_linked_search(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """refresh the recipes whose tags or ingredients changed"""
+    if not search.is_supported():
+        return
+    if action == 'pre_clear' and reverse:
+        instance._search_recipes = search.linked_recipe_ids(instance)
+    elif action == 'post_clear' and reverse:
+        search.update_search_vectors(instance._search_recipes)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        search.update_search_vectors(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_renamed_search(sender, instance, created, **kwargs):
+    """refresh the recipes using a renamed tag or ingredient"""
+    if not created and search.is_supported():
+        search.update_search_vectors(search.linked_recipe_ids(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_linked_recipes(sender, instance, **kwargs):
+    """remember the recipes of a tag or ingredient about to go"""
+    if search.is_supported():
+        instance._search_recipes = search.linked_recipe_ids(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_unlinked_search(sender, instance, **kwargs):
+    """refresh the recipes that lost a deleted tag or ingredient"""
+    search.update_search_vectors(getattr(instance, '_search_recipes', []))
+
+
+def _link_columns(sender, reverse):
+    """return the through columns of the instance and the other side"""
+    counted = 'tag_id' if sender is Recipe.tags.through else 'ingredient_id'
+    return (counted, 'recipe_id') if reverse else ('recipe_id', counted)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_linked_recipes(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    """keep recipe_count of tags and ingredients in step with the links
+
+    added links are counted as is, removals are recounted from the rows
+    left since a concurrent request may have removed the same links
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        # remove() is given ids that may not be linked at all
+        own, other = _link_columns(sender, reverse)
+        links = sender.objects.filter(**{own: instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(**{f'{other}__in': pk_set})
+        instance._unlinked = list(links.values_list(other, flat=True))
+        return
+    if action == 'post_add':
+        if reverse:
+            type(instance).objects.filter(pk=instance.pk).shift_recipe_count(
+                len(pk_set)
+            )
+        else:
+            model.objects.filter(pk__in=pk_set).shift_recipe_count(1)
+    elif action in ('post_remove', 'post_clear'):
+        changed = instance.__dict__.pop('_unlinked', [])
+        if reverse and changed:
+            type(instance).objects.filter(pk=instance.pk).recount_recipes()
+        elif changed:
+            model.objects.filter(pk__in=changed).recount_recipes()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_counted_links(sender, instance, **kwargs):
+    """remember the tags and ingredients of a recipe about to go
+
+    the m2m rows go with the recipe without sending m2m_changed
+    """
+    instance._counted = {
+        model: list(getattr(Recipe, relation).through.objects.filter(
+            recipe_id=instance.pk
+        ).values_list(f'{model._meta.model_name}_id', flat=True))
+        for relation, model in (('tags', Tag), ('ingredients', Ingredient))
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_deleted_recipe(sender, instance, **kwargs):
+    """recount the tags and ingredients a deleted recipe was linked to"""
+    for model, ids in getattr(instance, '_counted', {}).items():
+        if ids:
+            model.objects.filter(pk__in=ids).recount_recipes()
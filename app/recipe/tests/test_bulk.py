@@ -0,0 +1,195 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk')
+
+
+def sample_recipe(user, **params):
+    """create and return a sample recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minutes': 16,
+        'price': 17.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class BulkApiTests(TestCase):
+    """test creating, updating and deleting objects in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='passwordkangogo'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_recipes(self):
+        """test creating recipes with their tags and ingredients at once"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='beans')
+        payload = [
+            {'title': 'githeri', 'time_minutes': 60, 'price': '5.00',
+             'tags': [tag.id], 'ingredients': [ingredient.id]},
+            {'title': 'chapati', 'time_minutes': 30, 'price': '2.00'},
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['title'] for r in res.data],
+                         ['githeri', 'chapati'])
+        recipe = Recipe.objects.get(id=res.data[0]['id'])
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+        self.assertEqual(res.data[1]['tags'], [])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """test one invalid item rejects the batch with aligned errors"""
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='passwordother'
+        )
+        foreign_tag = Tag.objects.create(user=other, name='theirs')
+        payload = [
+            {'title': 'githeri', 'time_minutes': 60, 'price': '5.00'},
+            {'title': '', 'time_minutes': 30, 'price': '2.00'},
+            {'title': 'pilau', 'time_minutes': 30, 'price': '2.00',
+             'tags': [foreign_tag.id]},
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertIn('tags', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_recipes(self):
+        """test updating fields and tags of several recipes"""
+        recipe1 = sample_recipe(user=self.user, title='ugali')
+        recipe2 = sample_recipe(user=self.user, title='sukuma')
+        old_tag = Tag.objects.create(user=self.user, name='old')
+        new_tag = Tag.objects.create(user=self.user, name='new')
+        recipe2.tags.add(old_tag)
+        payload = [
+            {'id': recipe1.id, 'title': 'ugali mix'},
+            {'id': recipe2.id, 'tags': [new_tag.id]},
+        ]
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        self.assertEqual(recipe1.title, 'ugali mix')
+        self.assertEqual(list(recipe2.tags.all()), [new_tag])
+        self.assertEqual(res.data[1]['tags'], [new_tag.id])
+        old_tag.refresh_from_db()
+        new_tag.refresh_from_db()
+        self.assertEqual((old_tag.recipe_count, new_tag.recipe_count), (0, 1))
+
+    def test_bulk_update_unknown_recipe(self):
+        """test updating a recipe of another user is rejected"""
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='passwordother'
+        )
+        recipe = sample_recipe(user=other)
+
+        res = self.client.patch(
+            RECIPE_BULK_URL, [{'id': recipe.id, 'title': 'mine'}],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[0])
+
+    def test_bulk_delete_recipes(self):
+        """test deleting several recipes in one request"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        recipe3 = sample_recipe(user=self.user)
+
+        res = self.client.delete(
+            RECIPE_BULK_URL, [recipe1.id, recipe2.id], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Recipe.objects.all()), [recipe3])
+
+    def test_bulk_requires_list(self):
+        """test the bulk endpoint only accepts a non empty list"""
+        res = self.client.post(RECIPE_BULK_URL, {'title': 'x'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(RECIPE_BULK_URL, [], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_and_delete_tags(self):
+        """test tags can be created and deleted in bulk"""
+        res = self.client.post(
+            TAGS_BULK_URL, [{'name': 'vegan'}, {'name': 'quick'}],
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+        res = self.client.delete(
+            TAGS_BULK_URL, [tag['id'] for tag in res.data], format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_rename_ingredients(self):
+        """test ingredients can be renamed in bulk"""
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+
+        res = self.client.patch(
+            INGREDIENTS_BULK_URL,
+            [{'id': ingredient.id, 'name': 'sea salt'}],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'sea salt')
+
+    def test_bulk_create_tags_reuses_names(self):
+        """test bulk created tags reuse names that exist, ignoring case"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(
+            TAGS_BULK_URL,
+            [{'name': 'vegan'}, {'name': 'quick'}, {'name': 'QUICK'}],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(res.data[1]['id'], res.data[2]['id'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_rename_to_existing_name(self):
+        """test renaming onto another ingredient's name is rejected"""
+        Ingredient.objects.create(user=self.user, name='salt')
+        pepper = Ingredient.objects.create(user=self.user, name='pepper')
+
+        res = self.client.patch(
+            INGREDIENTS_BULK_URL, [{'id': pepper.id, 'name': 'Salt'}],
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        pepper.refresh_from_db()
+        self.assertEqual(pepper.name, 'pepper')
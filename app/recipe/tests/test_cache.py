@@ -0,0 +1,206 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from recipe.cache import check_shared_cache, get_cache, get_generation, \
+    stats
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class FakeRedis:
+    """in memory stand-in for the redis client used by RedisCache
+
+    clients of the same location share their data like separate
+    connections to one server
+    """
+    servers = {}
+
+    def __init__(self, location):
+        self.location = location
+        self.data = self.servers.setdefault(location, {})
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def incrby(self, key, delta):
+        self.data[key] = str(int(self.data[key]) + delta).encode('ascii')
+        return int(self.data[key])
+
+    def flushdb(self):
+        self.data.clear()
+
+
+class ListCacheTests(TestCase):
+    """test the per user cache of list responses"""
+
+    def setUp(self):
+        get_cache().clear()
+        stats.reset()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='passwordkangogo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_second_list_is_served_from_cache(self):
+        """test repeating a list request does not touch the database"""
+        Tag.objects.create(user=self.user, name='vegan')
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data[0]['name'], 'vegan')
+        self.assertEqual(stats.snapshot(), {'hits': 1, 'misses': 1})
+
+    def test_query_params_are_normalized(self):
+        """test parameter order does not change the cache key"""
+        self.client.get(TAGS_URL, {'assigned_only': 1, 'page_size': 10})
+        res = self.client.get(TAGS_URL + '?page_size=10&assigned_only=1')
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 0})
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_create_invalidates_cache(self):
+        """test creating a tag drops the cached lists of the user"""
+        self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {'name': 'dessert'})
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual([tag['name'] for tag in res.data], ['dessert'])
+
+    def test_recipe_update_invalidates_cache(self):
+        """test updating a recipe drops the cached recipe lists"""
+        res = self.client.post(RECIPE_URL, {
+            'title': 'githeri', 'time_minutes': 30, 'price': 10.00
+        })
+        url = reverse('recipe:recipe-detail', args=[res.data['id']])
+        self.client.get(RECIPE_URL)
+        self.client.patch(url, {'title': 'githeri special'})
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data[0]['title'], 'githeri special')
+
+    def test_cache_is_per_user(self):
+        """test users never see each other's cached lists"""
+        Tag.objects.create(user=self.user, name='vegan')
+        self.client.get(TAGS_URL)
+
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='passwordother'
+        )
+        self.client.force_authenticate(other)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data), 0)
+
+    def test_file_based_backend(self):
+        """test the list cache works on the file based backend"""
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={
+                'recipe_lists': {
+                    'BACKEND':
+                        'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': location,
+                },
+            }):
+                self.client.get(TAGS_URL)
+                res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    @override_settings(CACHES={
+        'recipe_lists': {
+            'BACKEND': 'recipe.cache.RedisCache',
+            'LOCATION': 'redis://localhost:6379/0',
+            'OPTIONS': {
+                'CLIENT_FACTORY': 'recipe.tests.test_cache.FakeRedis',
+            },
+        },
+    })
+    def test_redis_backend(self):
+        """test the list cache works on a redis compatible backend"""
+        get_cache().clear()
+        Tag.objects.create(user=self.user, name='vegan')
+        self.client.get(TAGS_URL)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data[0]['name'], 'vegan')
+
+        self.client.post(TAGS_URL, {'name': 'dessert'})
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data), 2)
+
+    def test_process_local_cache_refused(self):
+        """test a cache the processes do not share needs DEBUG on"""
+        local = {'recipe_lists': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+        with override_settings(CACHES=local, DEBUG=True):
+            check_shared_cache()
+        with override_settings(CACHES=local, DEBUG=False):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shared_cache()
+
+        shared = {'recipe_lists': {'BACKEND': 'recipe.cache.RedisCache'}}
+        with override_settings(CACHES=shared, DEBUG=False):
+            check_shared_cache()
+
+
+class GenerationCommitTests(TransactionTestCase):
+    """test writes invalidate the lists cached while they were open"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='passwordkangogo'
+        )
+
+    def test_generation_bumped_on_commit(self):
+        """test a generation read before the commit is retired by it"""
+        with transaction.atomic():
+            Tag.objects.create(user=self.user, name='vegan')
+            # a concurrent list read would cache the old rows under this
+            during = get_generation(self.user.pk)
+
+        self.assertNotEqual(get_generation(self.user.pk), during)
+
+    def test_rolled_back_write(self):
+        """test a rolled back write is not bumped again"""
+        try:
+            with transaction.atomic():
+                Tag.objects.create(user=self.user, name='vegan')
+                during = get_generation(self.user.pk)
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertEqual(get_generation(self.user.pk), during)
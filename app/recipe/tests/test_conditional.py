@@ -0,0 +1,138 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import RedisCache, get_cache
+
+RECIPE_URL = reverse('recipe:recipe-list')
+SHARED_CACHE = {
+    'BACKEND': 'recipe.cache.RedisCache',
+    'LOCATION': 'redis://localhost:6379/1',
+    'OPTIONS': {'CLIENT_FACTORY': 'recipe.tests.test_cache.FakeRedis'},
+}
+
+
+def detail_url(recipe_id):
+    """return recipe details url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalGetTests(TestCase):
+    """test etag and last modified handling of recipe reads"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='passwordkangogo'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='chapati',
+            time_minutes=30,
+            price=5.00
+        )
+
+    def test_list_not_modified(self):
+        """test a matching etag gets a 304 without any query"""
+        res = self.client.get(RECIPE_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertFalse(res.content)
+
+    def test_list_etag_changes_after_write(self):
+        """test writes by the user change the list etag"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+        Recipe.objects.create(
+            user=self.user,
+            title='mandazi',
+            time_minutes=20,
+            price=2.00
+        )
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data), 2)
+
+    def test_detail_not_modified(self):
+        """test a matching etag on the detail view gets a 304"""
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        self.assertIn('Last-Modified', res)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_wildcard(self):
+        """test `*` only gets a 304 for the user's existing recipes"""
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='password123'
+        )
+        others = Recipe.objects.create(
+            user=other,
+            title='githeri',
+            time_minutes=60,
+            price=3.00
+        )
+
+        res = self.client.get(detail_url(self.recipe.id),
+                              HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        for recipe_id in (others.id, 999):
+            res = self.client.get(detail_url(recipe_id),
+                                  HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_if_modified_since(self):
+        """test last modified is honoured on the detail view"""
+        url = detail_url(self.recipe.id)
+        since = http_date(self.recipe.updated_at.timestamp() + 1)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_tag_change_marks_recipe_modified(self):
+        """test adding a tag updates the recipe and its etag"""
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        updated_at = self.recipe.updated_at
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='vegan'))
+        self.recipe.refresh_from_db()
+        self.assertGreater(self.recipe.updated_at, updated_at)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    @override_settings(CACHES={'recipe_lists': SHARED_CACHE})
+    def test_write_in_other_process_changes_etag(self):
+        """test an etag is not honoured after a write in another process"""
+        get_cache().clear()
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        other = RedisCache(SHARED_CACHE['LOCATION'], SHARED_CACHE)
+        with mock.patch('recipe.cache.get_cache', return_value=other):
+            self.recipe.title = 'chapati ya mayai'
+            self.recipe.save()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'chapati ya mayai')
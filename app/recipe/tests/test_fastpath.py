@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import get_cache
+from recipe.fastpath import RowSerializer
+from recipe.serializer import RecipeSerializer, TagSerializer
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class FastPathTests(TestCase):
+    """test the values() based serializers match the model serializers"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='passwordkangogo'
+        )
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ingredient {i}')
+            for i in range(3)
+        ]
+        for i in range(4):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minutes=i * 10,
+                price='12.5',
+                link='https://example.com' if i % 2 else ''
+            )
+            recipe.tags.add(*reversed(tags[:i]))
+            recipe.ingredients.add(*ingredients[i:])
+
+    def test_recipe_rows_match_serializer(self):
+        """test recipe rows render to the same bytes as RecipeSerializer"""
+        queryset = Recipe.objects.order_by('-id').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients',
+                     queryset=Ingredient.objects.order_by('id')),
+        )
+        expected = RecipeSerializer(queryset, many=True).data
+
+        row_serializer = RowSerializer(RecipeSerializer)
+        data = row_serializer.to_representation(
+            Recipe, row_serializer.rows(queryset)
+        )
+
+        self.assertEqual(JSONRenderer().render(data),
+                         JSONRenderer().render(expected))
+
+    def test_tag_rows_match_serializer(self):
+        """test tag rows render to the same bytes as TagSerializer"""
+        queryset = Tag.objects.order_by('-name')
+        expected = TagSerializer(queryset, many=True).data
+
+        row_serializer = RowSerializer(TagSerializer)
+        data = row_serializer.to_representation(
+            Tag, row_serializer.rows(queryset)
+        )
+
+        self.assertEqual(JSONRenderer().render(data),
+                         JSONRenderer().render(expected))
+
+    def test_list_response_is_identical(self):
+        """test the api returns the same bytes with and without fast path"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with override_settings(RECIPE_FAST_SERIALIZERS=True):
+            fast = client.get(RECIPE_URL, {'page_size': 3})
+        get_cache().clear()
+        with override_settings(RECIPE_FAST_SERIALIZERS=False):
+            slow = client.get(RECIPE_URL, {'page_size': 3})
+
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(fast['Link'], slow['Link'])
@@ -0,0 +1,271 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, StoredFile
+from recipe import images
+from recipe.views import RecipeViewSet
+
+MEDIA_ROOT = tempfile.mkdtemp()
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def image_upload_url(recipe_id):
+    """return url for recipe image upload"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    """return recipe details url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def jpeg_file(size=(40, 20), orientation=None):
+    """return a temporary jpeg, optionally with an exif orientation"""
+    ntf = tempfile.NamedTemporaryFile(suffix='.jpg')
+    img = Image.new('RGB', size)
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        img.save(ntf, format='JPEG', exif=exif.tobytes())
+    else:
+        img.save(ntf, format='JPEG')
+    ntf.seek(0)
+    return ntf
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_WORKERS=0)
+class ImageProcessingTests(TransactionTestCase):
+    """test uploaded images are re-encoded with thumbnails"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='mypassword'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='pilau',
+            time_minutes=45,
+            price=7.00
+        )
+
+    def _upload(self, ntf):
+        with ntf:
+            return self.client.post(image_upload_url(self.recipe.id),
+                                    {'image': ntf}, format='multipart')
+
+    def test_upload_is_processed(self):
+        """test the upload is replaced by a re-encoded image"""
+        res = self._upload(jpeg_file())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        _fmt, ext = images.output_format()
+        self.assertTrue(self.recipe.image.name.endswith(f'.{ext}'))
+        self.assertEqual(len(self.recipe.image_hash), 64)
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            path = images.rendition_name(self.recipe.image_hash, width, ext)
+            self.assertTrue(default_storage.exists(path))
+        original = os.path.basename(res.data['image'])
+        self.assertFalse(default_storage.exists(
+            os.path.join(os.path.dirname(self.recipe.image.name), original)
+        ))
+
+    def test_status_exposed_on_recipe(self):
+        """test the image status and srcset are returned with the recipe"""
+        self._upload(jpeg_file())
+        self.recipe.refresh_from_db()
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertEqual(res.data['srcset'],
+                         images.srcset(self.recipe.image_hash))
+        res = self.client.get(RECIPE_URL)
+        widths = [str(width) for width in settings.RECIPE_IMAGE_WIDTHS]
+        self.assertEqual(list(res.data[0]['srcset']), widths)
+
+    def test_srcset_empty_without_image(self):
+        """test recipes without a processed image have no srcset"""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertIsNone(res.data['srcset'])
+
+    def test_serve_rendition(self):
+        """test renditions are served with immutable cache headers"""
+        self._upload(jpeg_file(size=(400, 200)))
+        self.recipe.refresh_from_db()
+        url = self.client.get(detail_url(self.recipe.id)).data['srcset']['160']
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', res['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual(img.size, (160, 80))
+
+    @override_settings(RECIPE_IMAGE_PRERENDER=False)
+    def test_rendition_rendered_on_demand(self):
+        """test a missing rendition is rendered on its first request"""
+        self._upload(jpeg_file(size=(400, 200)))
+        self.recipe.refresh_from_db()
+        digest = self.recipe.image_hash
+        _fmt, ext = images.output_format()
+        name = images.rendition_name(digest, 320, ext)
+        self.assertFalse(default_storage.exists(name))
+
+        res = self.client.get(images.rendition_url(digest, 320, ext))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_rendition_not_found(self):
+        """test unknown digests and widths outside the buckets are 404"""
+        self._upload(jpeg_file())
+        self.recipe.refresh_from_db()
+        _fmt, ext = images.output_format()
+
+        res = self.client.get(images.rendition_url('0' * 64, 160, ext))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(
+            images.rendition_url(self.recipe.image_hash, 161, ext)
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_exif_orientation_applied(self):
+        """test exif is stripped after rotating the pixels"""
+        if not hasattr(Image, 'Exif'):
+            self.skipTest('pillow cannot write exif')
+        self._upload(jpeg_file(size=(40, 20), orientation=6))
+
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.size, (20, 40))
+            self.assertNotIn('exif', img.info)
+
+    def test_replacing_image_removes_old_files(self):
+        """test a second upload discards the first image and thumbnails"""
+        self._upload(jpeg_file())
+        self.recipe.refresh_from_db()
+        first = self.recipe.image.name
+
+        self._upload(jpeg_file(size=(20, 40)))
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, first)
+        self.assertFalse(default_storage.exists(first))
+
+    def test_replacing_image_removes_old_renditions(self):
+        """test renditions of a replaced image are deleted"""
+        self._upload(jpeg_file(size=(40, 20)))
+        self.recipe.refresh_from_db()
+        _fmt, ext = images.output_format()
+        rendition = images.rendition_name(self.recipe.image_hash, 160, ext)
+
+        self._upload(jpeg_file(size=(20, 40)))
+        self.assertFalse(default_storage.exists(rendition))
+
+    def test_undecodable_image_fails(self):
+        """test an image pillow cannot decode is marked failed"""
+        name = default_storage.save('uploads/recipe/broken.jpg',
+                                    ContentFile(b'not an image'))
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image=name, image_status=Recipe.IMAGE_PENDING
+        )
+
+        with self.assertLogs('recipe.images', 'ERROR'):
+            images.process(self.recipe.pk, name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image.name, name)
+
+    def _processed_while_loaded(self):
+        """return a copy of the recipe loaded before its image processed"""
+        with mock.patch('recipe.images.schedule'):
+            self._upload(jpeg_file())
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        images.process(self.recipe.pk, stale.image.name)
+        return stale
+
+    def _assert_processed_image_kept(self, raw):
+        self.recipe.refresh_from_db()
+        processed = self.recipe.image.name
+        self.assertNotEqual(processed, raw)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(default_storage.exists(processed))
+        self.assertEqual(StoredFile.objects.get(name=processed).refs, 1)
+        self.assertFalse(StoredFile.objects.filter(name=raw).exists())
+
+    def test_stale_update_keeps_processed_image(self):
+        """test updating a recipe loaded before processing keeps the image"""
+        stale = self._processed_while_loaded()
+
+        with mock.patch.object(RecipeViewSet, 'get_object',
+                               return_value=stale):
+            res = self.client.patch(detail_url(self.recipe.id),
+                                    {'title': 'pilau ya nyama'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self._assert_processed_image_kept(stale._stored_image)
+        self.assertEqual(self.recipe.title, 'pilau ya nyama')
+
+    def test_stale_save_keeps_processed_image(self):
+        """test saving a recipe loaded before processing keeps the image"""
+        stale = self._processed_while_loaded()
+        raw = stale.image.name
+
+        stale.title = 'pilau ya kuku'
+        stale.save()
+
+        self._assert_processed_image_kept(raw)
+        self.assertEqual(stale.image.name, self.recipe.image.name)
+
+    def test_stuck_image_processed(self):
+        """test images lost by a stopped worker are processed again"""
+        with mock.patch('recipe.images.schedule'):
+            self._upload(jpeg_file())
+        fresh = Recipe.objects.create(
+            user=self.user,
+            title='ugali',
+            time_minutes=10,
+            price=1.00,
+            image='uploads/recipe/raw.jpg',
+            image_status=Recipe.IMAGE_PENDING
+        )
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=20)
+        )
+
+        out = StringIO()
+        call_command('process_stuck_images', minutes=15, stdout=out)
+
+        self.recipe.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(fresh.image_status, Recipe.IMAGE_PENDING)
+        self.assertIn('Processed 1 stuck images', out.getvalue())
@@ -1,3 +1,5 @@
+import gzip
+import json
 import tempfile
 import os
 
@@ -5,15 +7,19 @@ from PIL import Image
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
 from core.models import Recipe, Tag, Ingredient
+from recipe.cache import get_cache
 from recipe.serializer import RecipeSerializer, RecipeDetailSerializer
 
 RECIPE_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def image_upload_url(recipe_id):
@@ -167,6 +173,44 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def _count_create_queries(self, tags):
+        """return the number of queries used to create a recipe"""
+        payload = {
+            'title': 'pilau',
+            'tags': [tag.id for tag in tags],
+            'time_minutes': 40,
+            'price': 9.00
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPE_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return len(ctx.captured_queries)
+
+    def test_create_recipe_query_count_is_constant(self):
+        """test tag ids are validated with one query however many"""
+        tags = [sample_tag(user=self.user, name=f'tag {i}') for i in range(10)]
+        expected = self._count_create_queries(tags[:1])
+        self.assertEqual(self._count_create_queries(tags), expected)
+
+    def test_create_recipe_with_other_users_tags(self):
+        """test every tag of another user is reported as invalid"""
+        user2 = get_user_model().objects.create_user('other@bara.com',
+                                                     'password34556')
+        own_tag = sample_tag(user=self.user)
+        foreign = [sample_tag(user=user2, name=f'tag {i}') for i in range(2)]
+        payload = {
+            'title': 'pilau',
+            'tags': [own_tag.id] + [tag.id for tag in foreign],
+            'time_minutes': 40,
+            'price': 9.00
+        }
+
+        res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertFalse(Recipe.objects.exists())
+
     def test_recipe_partial_update(self):
         """test update using patch"""
         recipe = sample_recipe(user=self.user)
@@ -206,6 +250,59 @@ class PrivateRecipeApiTest(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_recipes_paginated_by_cursor(self):
+        """test recipes are returned in pages of bounded size"""
+        recipes = [sample_recipe(user=self.user, title=f'recipe {i}')
+                   for i in range(5)]
+
+        res = self.client.get(RECIPE_URL, {'page_size': 3})
+        self.assertEqual([r['id'] for r in res.data],
+                         [r.id for r in reversed(recipes[2:])])
+
+        next_url = res['Link'].split(';')[0].strip('<>')
+        res = self.client.get(next_url)
+        self.assertEqual([r['id'] for r in res.data],
+                         [r.id for r in reversed(recipes[:2])])
+        self.assertNotIn('rel="next"', res['Link'])
+
+    def _count_list_queries(self):
+        """return the number of queries used to list recipes"""
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        """test listing recipes does not issue a query per recipe"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        expected = self._count_list_queries()
+
+        for i in range(10):
+            recipe = sample_recipe(user=self.user, title=f'recipe {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        self.assertEqual(self._count_list_queries(), expected)
+
+    def test_detail_query_count(self):
+        """test recipe details fetch tags and ingredients in one query each"""
+        recipe = sample_recipe(user=self.user)
+        for i in range(5):
+            recipe.tags.add(sample_tag(user=self.user, name=f'tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'ingredient {i}')
+            )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(len(res.data['tags']), 5)
+        self.assertEqual(len(res.data['ingredients']), 5)
+
 
 class RecipeImageUploadTest(TestCase):
 
@@ -309,6 +406,108 @@ class RecipeImageUploadTest(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_filter_recipe_by_tag_and_ingredient(self):
+        """test tag and ingredient filters are applied together"""
+        tag = sample_tag(user=self.user, name='vegan')
+        ingredient = sample_ingredient(user=self.user, name='sukuma')
+        recipe1 = sample_recipe(user=self.user, title='sukuma wiki')
+        recipe1.tags.add(tag)
+        recipe1.ingredients.add(ingredient)
+        recipe2 = sample_recipe(user=self.user, title='chips')
+        recipe2.tags.add(tag)
 
+        res = self.client.get(
+            RECIPE_URL,
+            {'tags': f'{tag.id}', 'ingredients': f'{ingredient.id}'}
+        )
+        self.assertEqual([r['id'] for r in res.data], [recipe1.id])
+
+    def test_filter_recipe_match_any_is_distinct(self):
+        """test a recipe matching several tags is returned once"""
+        tag1 = sample_tag(user=self.user, name='spicy')
+        tag2 = sample_tag(user=self.user, name='quick')
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPE_URL, {'tags': f'{tag1.id},{tag2.id}'})
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_filter_recipe_match_all(self):
+        """test match=all only returns recipes with every tag"""
+        tag1 = sample_tag(user=self.user, name='spicy')
+        tag2 = sample_tag(user=self.user, name='quick')
+        recipe1 = sample_recipe(user=self.user, title='pilau')
+        recipe1.tags.add(tag1, tag2)
+        recipe2 = sample_recipe(user=self.user, title='biryani')
+        recipe2.tags.add(tag1)
+
+        res = self.client.get(
+            RECIPE_URL,
+            {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        )
+        self.assertEqual([r['id'] for r in res.data], [recipe1.id])
+
+    def test_filter_recipe_invalid_ids(self):
+        """test non numeric filter ids are rejected"""
+        res = self.client.get(RECIPE_URL, {'tags': 'one,two'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class RecipeExportTest(TestCase):
+    """test streaming the recipe book of a user"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='mypassword'
+        )
+        self.client.force_authenticate(self.user)
+        tag = sample_tag(user=self.user)
+        self.recipes = []
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'recipe {i}')
+            recipe.tags.add(tag)
+            self.recipes.append(recipe)
+        sample_recipe(
+            user=get_user_model().objects.create_user('other@bara.com',
+                                                      'password34556')
+        )
+
+    def test_export_ndjson(self):
+        """test the export streams one json document per line"""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([r['id'] for r in records],
+                         [r.id for r in reversed(self.recipes)])
+        self.assertEqual(records[0]['price'], '17.00')
+
+    def test_export_json_array_gzip(self):
+        """test the export can stream a gzipped json array"""
+        res = self.client.get(EXPORT_URL, {'output': 'json', 'gzip': 1})
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        records = json.loads(gzip.decompress(b''.join(res.streaming_content)))
+        expected = RecipeSerializer(
+            Recipe.objects.filter(user=self.user).order_by('-id'), many=True
+        ).data
+        self.assertEqual(records, json.loads(json.dumps(expected)))
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_reads_in_chunks(self):
+        """test the export fetches related ids once per chunk"""
+        res = self.client.get(EXPORT_URL)
+        with CaptureQueriesContext(connection) as ctx:
+            content = b''.join(res.streaming_content)
+        self.assertEqual(len(content.splitlines()), 5)
+        if connection.vendor == 'postgresql':
+            # the related ids come back as arrays with the recipes
+            self.assertEqual(len(ctx.captured_queries), 1)
+        else:
+            # one query for the recipes plus two per chunk of 2 recipes
+            self.assertEqual(len(ctx.captured_queries), 1 + 2 * 3)
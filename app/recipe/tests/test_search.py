@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import get_cache
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, **params):
+    """create and return a sample recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTests(TestCase):
+    """test the search query parameter of the recipe list"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.pilau = sample_recipe(self.user, title='Beef pilau')
+        self.pilau.tags.add(Tag.objects.create(user=self.user, name='Coast'))
+        self.githeri = sample_recipe(self.user, title='Githeri')
+        self.githeri.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Beans')
+        )
+        self.ugali = sample_recipe(self.user, title='Ugali')
+
+    def _titles(self, **params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data]
+
+    def test_search_title(self):
+        """test recipes are found by a word of their title"""
+        self.assertEqual(self._titles(search='pilau'), ['Beef pilau'])
+
+    def test_search_tag_and_ingredient_names(self):
+        """test recipes are found by their tag and ingredient names"""
+        self.assertEqual(self._titles(search='coast'), ['Beef pilau'])
+        self.assertEqual(self._titles(search='beans'), ['Githeri'])
+
+    def test_search_every_word(self):
+        """test every word of the search has to match"""
+        self.assertEqual(self._titles(search='beef coast'), ['Beef pilau'])
+        self.assertEqual(self._titles(search='beef beans'), [])
+
+    def test_search_combined_with_filters(self):
+        """test the search applies on top of the tag filter"""
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        self.ugali.tags.add(tag)
+
+        titles = self._titles(search='ugali', tags=str(tag.id))
+
+        self.assertEqual(titles, ['Ugali'])
+        self.assertEqual(self._titles(search='githeri', tags=str(tag.id)),
+                         [])
+
+    def test_search_limited_to_user(self):
+        """test other users' recipes are never returned"""
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='password123'
+        )
+        sample_recipe(other, title='Beef stew')
+
+        self.assertEqual(self._titles(search='beef'), ['Beef pilau'])
+
+    def test_renamed_tag_found(self):
+        """test renaming a tag makes recipes searchable by the new name"""
+        tag = self.pilau.tags.get()
+        tag.name = 'Swahili'
+        tag.save()
+
+        self.assertEqual(self._titles(search='swahili'), ['Beef pilau'])
@@ -79,6 +79,29 @@ class PrivateApiTests(TestCase):
         ).exists()
         self.assertTrue(tag_exists)
 
+    def test_create_existing_tag_returns_it(self):
+        """test creating a tag that exists in another case reuses it"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], tag.id)
+        self.assertEqual(res.data['name'], 'Vegan')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_same_name_for_other_users(self):
+        """test names are only unique per user"""
+        other = get_user_model().objects.create_user(
+            'other@baratel.com',
+            'password123'
+        )
+        Tag.objects.create(user=other, name='vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
     def test_create_tag_invalid(self):
         """test creating fails with invalid payload"""
         payload = {'name':''}
@@ -128,3 +151,63 @@ class PrivateApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
 
+    def test_retrieve_tags_with_recipe_count(self):
+        """test tags can be listed with the number of recipes using them"""
+        tag1 = Tag.objects.create(user=self.user, name='breakfast')
+        Tag.objects.create(user=self.user, name='lunch')
+        for title in ('mandazi', 'chai'):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=10,
+                price=5.00
+            )
+            recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'recipe_count': 1})
+        counts = {tag['name']: tag['recipe_count'] for tag in res.data}
+        self.assertEqual(counts, {'breakfast': 2, 'lunch': 0})
+
+    def test_retrieve_tags_by_popularity(self):
+        """test tags can be sorted and filtered by their recipe count"""
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('breakfast', 'lunch', 'supper')]
+        for index, title in enumerate(('mandazi', 'chai')):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=10,
+                price=5.00
+            )
+            recipe.tags.add(*tags[index + 1:])
+
+        res = self.client.get(TAGS_URL, {'popular': 1})
+        self.assertEqual([tag['name'] for tag in res.data],
+                         ['supper', 'lunch', 'breakfast'])
+
+        res = self.client.get(TAGS_URL, {'min_recipes': 1})
+        self.assertEqual([tag['name'] for tag in res.data],
+                         ['supper', 'lunch'])
+
+    def test_retrieve_tags_invalid_min_recipes(self):
+        """test a min_recipes that is not a number is rejected"""
+        res = self.client.get(TAGS_URL, {'min_recipes': 'many'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_paginated_with_link_header(self):
+        """test tags are paged by cursor with links in the header"""
+        for name in ('breakfast', 'lunch', 'supper'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data],
+                         ['supper', 'lunch'])
+        self.assertIn('rel="next"', res['Link'])
+
+        next_url = res['Link'].split(';')[0].strip('<>')
+        res = self.client.get(next_url)
+        self.assertEqual([tag['name'] for tag in res.data], ['breakfast'])
+        self.assertIn('rel="prev"', res['Link'])
+        self.assertNotIn('rel="next"', res['Link'])
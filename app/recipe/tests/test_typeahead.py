@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import get_cache
+from recipe.typeahead import PrefixIndex, indexes
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class TypeaheadTests(TestCase):
+    """test the q parameter of the tag and ingredient lists"""
+
+    def setUp(self):
+        get_cache().clear()
+        indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name in ('Sukuma', 'salt', 'Sugar', 'Spinach', 'beef'):
+            Ingredient.objects.create(user=self.user, name=name)
+
+    def _names(self, url, **params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_prefix_matches(self):
+        """test names starting with q are returned in name order"""
+        self.assertEqual(self._names(INGREDIENTS_URL, q='su'),
+                         ['Sugar', 'Sukuma'])
+        self.assertEqual(self._names(INGREDIENTS_URL, q='S', limit=2),
+                         ['salt', 'Spinach'])
+
+    def test_limited_to_user(self):
+        """test other users' names are not suggested"""
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='password123'
+        )
+        Tag.objects.create(user=other, name='Supper')
+        Tag.objects.create(user=self.user, name='Sunday')
+
+        self.assertEqual(self._names(TAGS_URL, q='su'), ['Sunday'])
+
+    def test_hot_user_served_from_memory(self):
+        """test repeated lookups are answered without queries"""
+        self._names(INGREDIENTS_URL, q='su')
+        self._names(INGREDIENTS_URL, q='sp')
+
+        with self.assertNumQueries(0):
+            names = self._names(INGREDIENTS_URL, q='sa')
+        self.assertEqual(names, ['salt'])
+
+    def test_misspelled_name_suggested(self):
+        """test a q no name starts with falls back to similar names"""
+        names = self._names(INGREDIENTS_URL, q='sukma')
+
+        if connection.vendor == 'postgresql':
+            self.assertEqual(names, ['Sukuma'])
+        else:
+            self.assertEqual(names, [])
+        self.assertEqual(self._names(INGREDIENTS_URL, q='sk'), [])
+
+    def test_new_name_visible(self):
+        """test names created after the index was built are suggested"""
+        for _ in range(3):
+            self._names(INGREDIENTS_URL, q='su')
+        Ingredient.objects.create(user=self.user, name='Sunflower oil')
+
+        self.assertEqual(self._names(INGREDIENTS_URL, q='su'),
+                         ['Sugar', 'Sukuma', 'Sunflower oil'])
+
+    def test_assigned_only(self):
+        """test q combines with assigned_only"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='sukuma wiki',
+            time_minutes=15,
+            price=2.00
+        )
+        recipe.ingredients.add(Ingredient.objects.get(name='Sukuma'))
+
+        self.assertEqual(
+            self._names(INGREDIENTS_URL, q='su', assigned_only=1),
+            ['Sukuma']
+        )
+
+    def test_filters_apply_to_hot_user(self):
+        """test filter params are honoured once the index is built"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Vegetarian')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='lentil stew',
+            time_minutes=30,
+            price=3.00
+        )
+        recipe.tags.add(vegan)
+
+        # the plain lookups build the user's index
+        for _ in range(3):
+            self.assertEqual(self._names(TAGS_URL, q='veg'),
+                             ['Vegan', 'Vegetarian'])
+        for _ in range(2):
+            self.assertEqual(self._names(TAGS_URL, q='veg', min_recipes=1),
+                             ['Vegan'])
+            self.assertEqual(self._names(TAGS_URL, q='veg', assigned_only=1),
+                             ['Vegan'])
+
+    def test_invalid_limit(self):
+        """test a limit that is not a number is rejected"""
+        res = self.client.get(INGREDIENTS_URL, {'q': 'su', 'limit': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prefix_index(self):
+        """test the prefix index stops at the first non matching name"""
+        index = PrefixIndex([(1, 'Beef'), (2, 'beans'), (3, 'Bread')])
+
+        self.assertEqual(index.search('be', 10),
+                         [{'id': 2, 'name': 'beans'},
+                          {'id': 1, 'name': 'Beef'}])
+        self.assertEqual(index.search('c', 10), [])
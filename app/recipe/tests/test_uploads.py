@@ -0,0 +1,285 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageUpload, Recipe
+from recipe import uploads
+
+MEDIA_ROOT = tempfile.mkdtemp()
+UPLOAD_DIR = tempfile.mkdtemp()
+
+
+def start_url(recipe_id):
+    """return url starting a resumable upload"""
+    return reverse('recipe:recipe-start-upload', args=[recipe_id])
+
+
+def chunk_url(recipe_id, upload_id):
+    """return url of a resumable upload"""
+    return reverse('recipe:recipe-upload-chunk', args=[recipe_id, upload_id])
+
+
+def commit_url(recipe_id, upload_id):
+    """return url committing a resumable upload"""
+    return reverse('recipe:recipe-commit-upload',
+                   args=[recipe_id, upload_id])
+
+
+def jpeg_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_UPLOAD_DIR=UPLOAD_DIR,
+                   RECIPE_IMAGE_WORKERS=0)
+class ResumableUploadTests(TestCase):
+    """test chunked image uploads"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(UPLOAD_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='mypassword'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='matoke',
+            time_minutes=40,
+            price=3.00
+        )
+        self.data = jpeg_bytes()
+
+    def _start(self, **payload):
+        payload.setdefault('size', len(self.data))
+        res = self.client.post(start_url(self.recipe.id), payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def _patch(self, upload_id, data, offset):
+        return self.client.generic(
+            'PATCH', chunk_url(self.recipe.id, upload_id), data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunked_upload(self):
+        """test an image sent in chunks becomes the recipe image"""
+        upload_id = self._start(
+            sha256=hashlib.sha256(self.data).hexdigest()
+        )
+        half = len(self.data) // 2
+
+        res = self._patch(upload_id, self.data[:half], 0)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(res['Upload-Offset'], str(half))
+        res = self.client.get(chunk_url(self.recipe.id, upload_id))
+        self.assertEqual(res.data['offset'], half)
+        self._patch(upload_id, self.data[half:], half)
+
+        res = self.client.post(commit_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.path.exists(
+            os.path.join(UPLOAD_DIR, f'{upload_id}.part')
+        ))
+
+    def test_empty_chunk(self):
+        """test a chunk without a body leaves the offset alone"""
+        upload_id = self._start()
+        self._patch(upload_id, self.data[:100], 0)
+
+        res = self._patch(upload_id, b'', 100)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(res['Upload-Offset'], '100')
+
+    def test_wrong_offset_conflicts(self):
+        """test a chunk sent at a stale offset is refused"""
+        upload_id = self._start()
+        self._patch(upload_id, self.data[:100], 0)
+
+        res = self._patch(upload_id, self.data[:100], 0)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '100')
+
+    def test_concurrent_chunk_conflicts(self):
+        """test a chunk sent while another one moved the offset is dropped"""
+        upload_id = self._start()
+        receive = uploads.receive
+
+        def overtaken(upload, stream):
+            chunk = receive(upload, stream)
+            ImageUpload.objects.filter(pk=upload.pk).update(offset=100)
+            return chunk
+
+        with mock.patch('recipe.uploads.receive', side_effect=overtaken):
+            res = self._patch(upload_id, self.data[:50], 0)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '100')
+        self.assertFalse(os.path.exists(
+            os.path.join(UPLOAD_DIR, f'{upload_id}.part')
+        ))
+        self.assertFalse([name for name in os.listdir(UPLOAD_DIR)
+                          if name.endswith('.chunk')])
+
+    def test_resume_rebuilds_checksum(self):
+        """test the checksum survives a process losing its memory"""
+        upload_id = self._start(
+            sha256=hashlib.sha256(self.data).hexdigest()
+        )
+        self._patch(upload_id, self.data[:100], 0)
+        uploads._hashes.clear()
+        self._patch(upload_id, self.data[100:], 100)
+
+        res = self.client.post(commit_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bad_header_rejected(self):
+        """test a file that is not an image is refused on its first bytes"""
+        upload_id = self._start(size=1000)
+
+        res = self._patch(upload_id, b'%PDF-1.4' + b'\0' * 992, 0)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_checksum_mismatch(self):
+        """test a commit is refused when the checksum does not match"""
+        upload_id = self._start(sha256='0' * 64)
+        self._patch(upload_id, self.data, 0)
+
+        res = self.client.post(commit_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_incomplete_commit(self):
+        """test an upload cannot be committed before all bytes arrive"""
+        upload_id = self._start()
+        self._patch(upload_id, self.data[:100], 0)
+
+        res = self.client.post(commit_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_chunk_past_declared_size(self):
+        """test bytes beyond the declared size are refused"""
+        upload_id = self._start(size=100)
+
+        res = self._patch(upload_id, self.data[:200], 0)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(res['Upload-Offset'], '0')
+
+    def test_other_users_recipe(self):
+        """test uploads cannot be started on another user's recipe"""
+        other = get_user_model().objects.create_user(
+            email='other@baratel.com',
+            password='mypassword'
+        )
+        recipe = Recipe.objects.create(
+            user=other,
+            title='ugali',
+            time_minutes=10,
+            price=1.00
+        )
+
+        res = self.client.post(start_url(recipe.id), {'size': 10})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def _expire(self, upload_id):
+        ImageUpload.objects.filter(pk=upload_id).update(
+            updated_at=timezone.now() - timedelta(hours=25)
+        )
+
+    def test_expired_upload_rejected(self):
+        """test an upload left without chunks cannot be resumed"""
+        upload_id = self._start()
+        self._patch(upload_id, self.data[:100], 0)
+        self._expire(upload_id)
+
+        res = self._patch(upload_id, self.data[100:], 100)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.post(commit_url(self.recipe.id, upload_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_chunk_extends_expiry(self):
+        """test every received chunk keeps the upload alive"""
+        upload_id = self._start()
+        ImageUpload.objects.filter(pk=upload_id).update(
+            updated_at=timezone.now() - timedelta(hours=23)
+        )
+
+        self._patch(upload_id, self.data[:100], 0)
+
+        upload = ImageUpload.objects.get(pk=upload_id)
+        self.assertGreater(upload.updated_at,
+                           timezone.now() - timedelta(hours=1))
+
+    def test_expired_uploads_cleared(self):
+        """test the command removes expired uploads and their files"""
+        expired_id = self._start()
+        self._patch(expired_id, self.data[:100], 0)
+        self._expire(expired_id)
+        live_id = self._start()
+        self._patch(live_id, self.data[:100], 0)
+        out = StringIO()
+
+        call_command('clear_expired_uploads', stdout=out)
+
+        self.assertEqual(
+            list(ImageUpload.objects.values_list('id', flat=True)),
+            [uuid.UUID(live_id)]
+        )
+        self.assertFalse(os.path.exists(
+            os.path.join(UPLOAD_DIR, f'{expired_id}.part')
+        ))
+        self.assertNotIn(uuid.UUID(expired_id), uploads._hashes)
+        self.assertIn('Deleted 1 expired uploads', out.getvalue())
+
+    def test_stale_checksums_dropped(self):
+        """test checksums of uploads no longer receiving chunks expire"""
+        first = self._start()
+        self._patch(first, self.data[:100], 0)
+        offset, digest, at = uploads._hashes[uuid.UUID(first)]
+        uploads._hashes[uuid.UUID(first)] = (offset, digest, at - 25 * 3600)
+        second = self._start()
+
+        self._patch(second, self.data[:100], 0)
+
+        self.assertNotIn(uuid.UUID(first), uploads._hashes)
+        self.assertIn(uuid.UUID(second), uploads._hashes)
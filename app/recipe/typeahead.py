@@ -0,0 +1,157 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import CharField
+from django.db.models.functions import Lower
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .cache import request_generation
+
+# what django.contrib.postgres registers, without its psycopg2 hooks
+CharField.register_lookup(TrigramSimilar)
+
+
+class PrefixIndex:
+    """sorted names of one user's tags or ingredients
+
+    a sorted array searched with bisect answers the same queries as a
+    trie in far less memory
+    """
+
+    def __init__(self, rows):
+        entries = sorted((name.lower(), pk, name) for pk, name in rows)
+        self.keys = [key for key, _pk, _name in entries]
+        self.items = [{'id': pk, 'name': name} for _key, pk, name in entries]
+
+    def search(self, prefix, limit):
+        """return up to limit items whose name starts with prefix"""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        found = []
+        for index in range(start, min(start + limit, len(self.keys))):
+            if not self.keys[index].startswith(prefix):
+                break
+            found.append(self.items[index])
+        return found
+
+
+class PrefixIndexCache:
+    """per process LRU of the prefix indexes of hot users
+
+    an index is only built on a user's second lookup within the same
+    cache generation, and users with too many names are never indexed
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._indexes = OrderedDict()
+            self._seen = OrderedDict()
+
+    def _touch(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > settings.RECIPE_TYPEAHEAD_USERS:
+            store.popitem(last=False)
+
+    def get(self, key, load):
+        """return the index for key, or None while the user is not hot
+
+        load returns the (id, name) rows, or None when there are too many
+        """
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+            if key not in self._seen:
+                self._touch(self._seen, key, True)
+                return None
+        rows = load()
+        if rows is None:
+            return None
+        index = PrefixIndex(rows)
+        with self._lock:
+            self._seen.pop(key, None)
+            self._touch(self._indexes, key, index)
+        return index
+
+
+indexes = PrefixIndexCache()
+
+
+class TypeaheadMixin:
+    """answer `?q=` with the top matching names instead of the full list
+
+    prefix matches are returned ordered by name; on postgres a q no name
+    starts with falls back to trigram matches ordered by similarity, so
+    lookups with prefix matches stay on the hot user index
+    """
+    typeahead_limit = 10
+    typeahead_max_limit = 50
+    # trigram similarity of shorter strings matches almost anything
+    typeahead_fuzzy_min_length = 3
+    # params narrowing the queryset, which the hot user index cannot apply
+    typeahead_filter_params = ('assigned_only', 'min_recipes', 'popular',
+                               'recipe_count')
+
+    def _typeahead_limit(self):
+        try:
+            limit = int(self.request.query_params.get(
+                'limit', self.typeahead_limit
+            ))
+        except ValueError:
+            raise ValidationError(_('limit must be a number'))
+        return max(1, min(limit, self.typeahead_max_limit))
+
+    def _load_rows(self):
+        rows = list(self.queryset.filter(
+            user=self.request.user
+        ).values_list('id', 'name')[:settings.RECIPE_TYPEAHEAD_MAX_NAMES + 1])
+        if len(rows) > settings.RECIPE_TYPEAHEAD_MAX_NAMES:
+            return None
+        return rows
+
+    def _prefix_matches(self, queryset, q, limit):
+        # plain lookups can be answered from the hot user index
+        plain = not any(param in self.request.query_params
+                        for param in self.typeahead_filter_params)
+        if plain:
+            key = (self.queryset.model._meta.label, self.request.user.pk,
+                   request_generation(self.request))
+            index = indexes.get(key, self._load_rows)
+            if index is not None:
+                return index.search(q, limit)
+        return list(queryset.filter(name__istartswith=q).order_by(
+            Lower('name'), 'id'
+        ).values('id', 'name')[:limit])
+
+    def _fuzzy_matches(self, queryset, q, limit):
+        if connection.vendor != 'postgresql' or \
+                len(q) < self.typeahead_fuzzy_min_length:
+            return []
+        return list(queryset.filter(name__trigram_similar=q).annotate(
+            similarity=TrigramSimilarity('name', q)
+        ).order_by('-similarity', 'id').values('id', 'name')[:limit])
+
+    def list(self, request, *args, **kwargs):
+        """list objects, or the best name matches when q is given"""
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            return super().list(request, *args, **kwargs)
+        limit = self._typeahead_limit()
+        queryset = self.get_queryset().order_by()
+        found = self._prefix_matches(queryset, q, limit)
+        if not found:
+            found = self._fuzzy_matches(queryset, q, limit)
+        return Response(found)
@@ -0,0 +1,201 @@
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+CHUNK_SIZE = 64 * 1024
+
+# magic bytes of the formats accepted for recipe images, checked against
+# the first bytes of an upload so bad files are refused straight away
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+HEADER_SIZE = 12
+
+# upload id: (offset, checksum, monotonic time), oldest first
+_hashes = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+def sniff(header):
+    """return the extension of an image from its first bytes, or None"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    for signature, ext in SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    return None
+
+
+def expiry_cutoff():
+    """return the time before which an untouched upload has expired"""
+    return timezone.now() - timedelta(
+        hours=settings.RECIPE_UPLOAD_EXPIRE_HOURS
+    )
+
+
+def upload_path(upload):
+    """return the temporary file receiving an upload"""
+    return os.path.join(settings.RECIPE_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def read_header(upload):
+    """return the first bytes received for an upload"""
+    try:
+        with open(upload_path(upload), 'rb') as handle:
+            return handle.read(HEADER_SIZE)
+    except FileNotFoundError:
+        return b''
+
+
+def _hash_until(path, offset):
+    """hash the first offset bytes of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        remaining = offset
+        while remaining:
+            data = handle.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+    return digest
+
+
+def _get_hash(upload):
+    """return the running checksum of the bytes received so far
+
+    it is kept in memory between chunks; a process that did not see the
+    previous chunks rebuilds it once from the file
+    """
+    with _hashes_lock:
+        offset, digest, _at = _hashes.pop(upload.pk, (None, None, None))
+    if offset == upload.offset:
+        return digest
+    if not upload.offset:
+        return hashlib.sha256()
+    return _hash_until(upload_path(upload), upload.offset)
+
+
+def _remember_hash(upload_id, offset, digest):
+    """keep the checksum of an upload for its next chunk
+
+    checksums of uploads that stopped receiving chunks expire with them,
+    including those another process deleted
+    """
+    now = time.monotonic()
+    cutoff = now - settings.RECIPE_UPLOAD_EXPIRE_HOURS * 3600
+    with _hashes_lock:
+        _hashes.pop(upload_id, None)
+        _hashes[upload_id] = (offset, digest, now)
+        while next(iter(_hashes.values()))[2] < cutoff:
+            _hashes.popitem(last=False)
+
+
+def forget(upload):
+    """drop the temporary files and checksum of an upload"""
+    with _hashes_lock:
+        _hashes.pop(upload.pk, None)
+    paths = glob.glob(os.path.join(settings.RECIPE_UPLOAD_DIR,
+                                   f'{upload.pk}.*.chunk'))
+    for path in [upload_path(upload)] + paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class InvalidImage(Exception):
+    """the first bytes of an upload are not a supported image"""
+
+
+class TooLarge(Exception):
+    """a chunk goes past the declared size of an upload"""
+
+
+class Chunk:
+    """a request body received for an upload, not yet part of its file"""
+
+    def __init__(self, upload, path, start, end, digest):
+        self.upload = upload
+        self.path = path
+        self.start = start
+        self.end = end
+        self.digest = digest
+
+
+def receive(upload, stream):
+    """copy a request body next to the file of an upload
+
+    the body is copied in CHUNK_SIZE pieces to a file of its own, so
+    memory stays bounded and concurrent requests never write over each
+    other, and the first bytes of the upload are checked before anything
+    past them is read; returns the Chunk, which attach() adds to the
+    upload
+    """
+    os.makedirs(settings.RECIPE_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.RECIPE_UPLOAD_DIR,
+                        f'{upload.pk}.{uuid.uuid4().hex}.chunk')
+    digest = _get_hash(upload)
+    offset = upload.offset
+    header = read_header(upload)[:offset] if offset < HEADER_SIZE else None
+    try:
+        with open(path, 'wb') as handle:
+            while True:
+                size = (CHUNK_SIZE if header is None
+                        else HEADER_SIZE - len(header))
+                data = stream.read(size)
+                if not data:
+                    break
+                if offset + len(data) > upload.size:
+                    raise TooLarge()
+                if header is not None:
+                    header += data
+                    if len(header) == HEADER_SIZE:
+                        if sniff(header) is None:
+                            raise InvalidImage()
+                        header = None
+                handle.write(data)
+                digest.update(data)
+                offset += len(data)
+    except BaseException:
+        os.remove(path)
+        raise
+    return Chunk(upload, path, upload.offset, offset, digest)
+
+
+def attach(chunk):
+    """write a received chunk at its offset of the upload file"""
+    path = upload_path(chunk.upload)
+    with open(path, 'r+b' if os.path.exists(path) else 'w+b') as handle:
+        handle.seek(chunk.start)
+        # anything past the offset is a chunk that was never acknowledged
+        handle.truncate()
+        with open(chunk.path, 'rb') as source:
+            shutil.copyfileobj(source, handle, CHUNK_SIZE)
+    discard(chunk)
+    _remember_hash(chunk.upload.pk, chunk.end, chunk.digest)
+
+
+def discard(chunk):
+    """delete a received chunk"""
+    try:
+        os.remove(chunk.path)
+    except FileNotFoundError:
+        pass
+
+
+def checksum(upload):
+    """return the sha256 of a complete upload"""
+    return _get_hash(upload).hexdigest()
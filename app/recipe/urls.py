@@ -13,4 +13,6 @@ app_name = 'recipe'
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    path('images/<slug:digest>/<int:width>.<slug:ext>',
+         views.image_rendition, name='image-rendition'),
+]
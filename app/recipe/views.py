@@ -1,86 +1,269 @@
-from rest_framework.generics import ListAPIView
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from django.views.decorators.http import require_safe
 from rest_framework import viewsets,mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from core.models import Tag, Ingredient, Recipe
-from . serializer import TagSerializer, IngredientSerializer, RecipeSerializer, RecipeDetailSerializer, RecipeImageSerializer
+from core.db.pool import release_connection
+from core.models import Tag, Ingredient, Recipe, ImageUpload
+from user.authentication import CachedTokenAuthentication, \
+    SignedTokenAuthentication
+from . import images, search, uploads
+from .bulk import BulkMixin
+from .cache import CachedListMixin, ConditionalGetMixin
+from .export import gzipped, iter_records, json_array, ndjson_lines
+from .fastpath import FastListMixin, get_row_serializer
+from .pagination import RecipePagination, RecipeAttrPagination
+from .typeahead import TypeaheadMixin
+from . serializer import TagSerializer, TagCountSerializer, \
+    IngredientSerializer, IngredientCountSerializer, RecipeSerializer, \
+    RecipeBulkSerializer, RecipeDetailSerializer, RecipeImageSerializer, \
+    ImageUploadSerializer
 
+UPLOAD_ID = r'(?P<upload_id>[0-9a-f-]{36})'
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+
+class BaseRecipeAttrViewSet(TypeaheadMixin,
+                            BulkMixin,
+                            CachedListMixin,
+                            FastListMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
 
     """base viewset for managing ingreidnets and tags attribures"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeAttrPagination
+
+    def _flag(self, name):
+        """return whether a 0/1 query param is switched on"""
+        return bool(int(self.request.query_params.get(name, 0)))
+
+    def _min_recipes(self):
+        """return the min_recipes query param as a number, if given"""
+        value = self.request.query_params.get('min_recipes')
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError(_('min_recipes must be a number'))
 
     def get_queryset(self):
-        """retrieve objects for authenticated user"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
-        queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        """retrieve objects for authenticated user
+
+        recipe_count is a maintained column, so filtering and sorting by
+        popularity never joins the recipe links
+        """
+        queryset = self.queryset.filter(user=self.request.user)
+        if self._flag('assigned_only'):
+            queryset = queryset.filter(recipe_count__gt=0)
+        min_recipes = self._min_recipes()
+        if min_recipes is not None:
+            queryset = queryset.filter(recipe_count__gte=min_recipes)
+        if self._flag('popular'):
+            self.pagination_ordering = ('-recipe_count', 'id')
+            return queryset.order_by(*self.pagination_ordering)
+        return queryset.order_by('-name', 'id')
+
+    def get_serializer_class(self):
+        """return the counting serializer when counts are requested"""
+        if self.action == 'list' and self._flag('recipe_count'):
+            return self.count_serializer_class
+        return self.serializer_class
+
+    def create(self, request, *args, **kwargs):
+        """create an object, or return the user's one with that name"""
+        response = super().create(request, *args, **kwargs)
+        if not self.created:
+            response.status_code = status.HTTP_200_OK
+        return response
 
     def perform_create(self, serializer):
-        """create the object"""
-        serializer.save(user=self.request.user)
+        """create the object unless the name exists, ignoring case"""
+        serializer.instance, self.created = (
+            self.queryset.model.objects.get_or_create_name(
+                self.request.user, serializer.validated_data['name']
+            )
+        )
+        self.invalidate_list_cache()
+
+    def bulk_create(self, items):
+        """create the items, reusing the user's objects with those names"""
+        validated, errors = self._bulk_validate(items)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            found, _created = self.queryset.model.objects.get_or_create_names(
+                self.request.user.pk, [data['name'] for data in validated]
+            )
+        self.invalidate_list_cache()
+        return self._bulk_response(
+            [found[data['name'].lower()] for data in validated],
+            status.HTTP_201_CREATED
+        )
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """manage tags in the database"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    bulk_serializer_class = TagSerializer
+    count_serializer_class = TagCountSerializer
+    recipe_relation = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """manage ingredients in the database"""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    bulk_serializer_class = IngredientSerializer
+    count_serializer_class = IngredientCountSerializer
+    recipe_relation = 'ingredients'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(BulkMixin, ConditionalGetMixin, CachedListMixin,
+                    FastListMixin, viewsets.ModelViewSet):
     """manage recipes in the database"""
     serializer_class = RecipeSerializer
-    authentication_classes = (TokenAuthentication,)
+    bulk_serializer_class = RecipeBulkSerializer
+    bulk_relations = {'tags': Tag, 'ingredients': Ingredient}
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
     queryset = Recipe.objects.all()
+    pagination_class = RecipePagination
 
     def _params_to_ids(self, qs):
         """convert list of  string ids to list of  int ids"""
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return {int(str_id) for str_id in qs.split(',')}
+        except ValueError:
+            raise ValidationError(_('Expected a comma separated list of ids'))
+
+    def _filter_related(self, queryset, relation, ids, match_all):
+        """keep recipes linked to any or all of the given related ids"""
+        column = Recipe._meta.get_field(relation).m2m_reverse_field_name()
+        links = getattr(Recipe, relation).through.objects.filter(
+            **{f'{column}__in': ids}
+        ).order_by()
+        if match_all:
+            # one grouped pass over the m2m rows instead of a join per id
+            matched = links.values('recipe_id').annotate(
+                matched=Count(column)
+            ).filter(matched=len(ids)).values('recipe_id')
+            return queryset.filter(id__in=matched)
+        linked = Exists(links.filter(recipe_id=OuterRef('pk')))
+        return queryset.annotate(
+            **{f'has_{relation}': linked}
+        ).filter(**{f'has_{relation}': True})
 
     def get_queryset(self):
         """retrieve the recipes for authenticated user"""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tags_ids = self._params_to_ids(tags)
-            queryset = self.queryset.filter(tags__id__in=tags_ids)
-        if ingredients:
-            ingredients_ids = self._params_to_ids(ingredients)
-            queryset = self.queryset.filter(ingredients__id__in=ingredients_ids)
-
-        return queryset.filter(user=self.request.user)
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError(_('match must be one of: any, all'))
+
+        queryset = self.queryset.filter(user=self.request.user)
+        for relation in ('tags', 'ingredients'):
+            param = self.request.query_params.get(relation)
+            if param:
+                queryset = self._filter_related(
+                    queryset, relation, self._params_to_ids(param),
+                    match == 'all'
+                )
+        ordering = ('-id',)
+        text = self.request.query_params.get('search', '').strip()
+        if text and self.action == 'list':
+            queryset, ordering = search.search(queryset, text)
+        self.pagination_ordering = ordering
+        return self._prefetch_for_action(queryset).defer(
+            'search_vector'
+        ).order_by(*ordering)
+
+    def _prefetch_for_action(self, queryset):
+        """prefetch the related objects the current action serializes"""
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+                Prefetch('ingredients',
+                         queryset=Ingredient.objects.only('id', 'name')),
+            )
+        if self.action in ('list', 'bulk'):
+            return queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only(
+                    'id'
+                ).order_by('id')),
+                Prefetch('ingredients', queryset=Ingredient.objects.only(
+                    'id'
+                ).order_by('id')),
+            )
+        return queryset
+
+    def bulk_written(self, objs):
+        """refresh the search vectors of the written recipes"""
+        search.update_search_vectors(obj.pk for obj in objs)
+
+    def get_bulk_queryset(self):
+        """return the written recipes with their relations prefetched"""
+        return self._prefetch_for_action(super().get_bulk_queryset())
 
     def get_serializer_class(self):
         """return appropriate serializer class"""
         if self.action == 'retrieve':
             return RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'commit_upload'):
             return RecipeImageSerializer
+        elif self.action in ('start_upload', 'upload_chunk'):
+            return ImageUploadSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
         """save a new recipe """
         serializer.save(user=self.request.user)
 
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """stream every recipe of the user as ndjson or a json array"""
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'json'):
+            raise ValidationError(_('output must be one of: ndjson, json'))
+
+        records = iter_records(
+            self.get_queryset(),
+            get_row_serializer(self.serializer_class),
+            settings.RECIPE_EXPORT_CHUNK_SIZE
+        )
+        if output == 'ndjson':
+            content = ndjson_lines(records)
+            content_type = 'application/x-ndjson'
+        else:
+            content = json_array(records)
+            content_type = 'application/json'
+
+        gzip = self.request.query_params.get('gzip') == '1'
+        if gzip:
+            content = gzipped(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        if gzip:
+            response['Content-Encoding'] = 'gzip'
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{output}"'
+        )
+        return response
+
     # @action(methods=['POST'],detail=True,url_path='upload-image')
     # def upload_image(self,request,pk=None):
     #     """upload an image to a recipe"""
@@ -102,7 +285,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
     #         )
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to a recipe"""
+        """Upload an image to a recipe
+
+        the upload is stored as is and re-encoded in the background,
+        image_status tells the client when the processed image is ready
+        """
         recipe = self.get_object()
         serializer = self.get_serializer(
             recipe,
@@ -110,7 +297,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save(image_status=Recipe.IMAGE_PENDING,
+                                image_hash='')
+            images.schedule(recipe.pk, recipe.image.name)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -120,3 +310,134 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    def _get_upload(self, upload_id, lock=False):
+        """return an upload of the recipe in the url"""
+        queryset = ImageUpload.objects.filter(
+            recipe=self.get_object(), updated_at__gte=uploads.expiry_cutoff()
+        )
+        if lock:
+            queryset = queryset.select_for_update()
+        try:
+            return queryset.get(pk=upload_id)
+        except ImageUpload.DoesNotExist:
+            raise Http404
+
+    def _offset_response(self, upload, status_code, data=None):
+        response = Response(data, status=status_code)
+        response['Upload-Offset'] = upload.offset
+        return response
+
+    @action(methods=['POST'], detail=True, url_path='uploads')
+    def start_upload(self, request, pk=None):
+        """start a resumable upload of a recipe image
+
+        the file is then sent with PATCH requests carrying an
+        Upload-Offset header, and attached with a final commit
+        """
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(user=request.user, recipe=recipe)
+        return self._offset_response(upload, status.HTTP_201_CREATED,
+                                     serializer.data)
+
+    @action(methods=['GET', 'PATCH', 'DELETE'], detail=True,
+            url_path=f'uploads/{UPLOAD_ID}')
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """report, append to or abort a resumable upload
+
+        the PATCH body is streamed to disk, it is never parsed
+        """
+        if request.method == 'GET':
+            upload = self._get_upload(upload_id)
+            return self._offset_response(
+                upload, status.HTTP_200_OK,
+                self.get_serializer(upload).data
+            )
+        if request.method == 'DELETE':
+            self._get_upload(upload_id).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        upload = self._get_upload(upload_id)
+        if request.META.get('HTTP_UPLOAD_OFFSET') != str(upload.offset):
+            return self._offset_response(upload, status.HTTP_409_CONFLICT)
+        if request.stream is None:
+            # an empty body is a chunk of no bytes
+            return self._offset_response(upload, status.HTTP_204_NO_CONTENT)
+        # a slow client must not hold a transaction or a pooled connection
+        # while it sends up to RECIPE_UPLOAD_MAX_SIZE bytes
+        release_connection()
+        try:
+            chunk = uploads.receive(upload, request.stream)
+        except uploads.InvalidImage:
+            upload.delete()
+            return Response(
+                {'image': [_('Upload a valid image.')]},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        except uploads.TooLarge:
+            return self._offset_response(
+                upload, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        with transaction.atomic():
+            # only one of the requests sent at this offset moves it
+            moved = ImageUpload.objects.filter(
+                pk=upload.pk, offset=upload.offset
+            ).update(offset=chunk.end, updated_at=timezone.now())
+            if moved:
+                uploads.attach(chunk)
+        if not moved:
+            uploads.discard(chunk)
+            return self._offset_response(self._get_upload(upload_id),
+                                         status.HTTP_409_CONFLICT)
+        upload.offset = chunk.end
+        return self._offset_response(upload, status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['POST'], detail=True,
+            url_path=f'uploads/{UPLOAD_ID}/commit')
+    def commit_upload(self, request, pk=None, upload_id=None):
+        """attach a complete upload to the recipe as its image"""
+        with transaction.atomic():
+            upload = self._get_upload(upload_id, lock=True)
+            if upload.offset != upload.size:
+                return self._offset_response(
+                    upload, status.HTTP_409_CONFLICT,
+                    {'detail': _('The upload is not complete.')}
+                )
+            ext = uploads.sniff(uploads.read_header(upload))
+            if ext is None or (upload.sha256 and
+                               uploads.checksum(upload) != upload.sha256):
+                upload.delete()
+                return Response(
+                    {'image': [_('The upload is corrupted.')]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            recipe = upload.recipe
+            with open(uploads.upload_path(upload), 'rb') as handle:
+                recipe.image.save(f'upload.{ext}', File(handle), save=False)
+            recipe.image_status = Recipe.IMAGE_PENDING
+            recipe.image_hash = ''
+            recipe.save()
+            upload.delete()
+            images.schedule(recipe.pk, recipe.image.name)
+        return Response(self.get_serializer(recipe).data,
+                        status=status.HTTP_200_OK)
+
+
+@require_safe
+def image_rendition(request, digest, width, ext):
+    """serve a width bucketed rendition of a recipe image
+
+    renditions are named after the content of their source, so they
+    are cached forever by clients and proxies
+    """
+    if width not in settings.RECIPE_IMAGE_WIDTHS or ext not in images.FORMATS:
+        raise Http404
+    name = images.get_rendition(digest, width, ext)
+    if name is None:
+        raise Http404
+    response = FileResponse(default_storage.open(name),
+                            content_type=images.CONTENT_TYPES[ext])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,171 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, \
+    TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from . import tokens as signed_tokens
+
+
+class TokenCache:
+    """thread safe LRU of token snapshots that expire after a ttl
+
+    snapshots are plain values, so every request builds its own user
+    instead of sharing one instance between threads
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def get(self, key):
+        """return the snapshot of key, or None when absent or stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL, data
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+tokens = TokenCache()
+
+
+def get_shared_cache():
+    """return the cache shared between processes, if one is configured"""
+    if not settings.AUTH_TOKEN_SHARED_CACHE:
+        return None
+    return caches[settings.AUTH_TOKEN_SHARED_CACHE]
+
+
+def _shared_key(key):
+    # the raw token never leaves the process
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+# the user fields requests rely on; the password hash and the rest are
+# deferred and loaded from the database if anything asks for them
+SNAPSHOT_FIELDS = ('id', 'email', 'name', 'is_active', 'is_staff',
+                   'is_superuser')
+
+
+def snapshot(token):
+    """return the cacheable values of a token, without its key"""
+    return (token.created,
+            {name: getattr(token.user, name) for name in SNAPSHOT_FIELDS})
+
+
+def from_snapshot(key, data):
+    """rebuild the token presented as key and its user from a snapshot"""
+    created, values = data
+    model = get_user_model()
+    names = [field.attname for field in model._meta.concrete_fields
+             if field.attname in values]
+    user = model.from_db(DEFAULT_DB_ALIAS, names,
+                         [values[name] for name in names])
+    token = Token(key=key, user=user, created=created)
+    token._state.adding = False
+    token._state.db = DEFAULT_DB_ALIAS
+    return token
+
+
+def invalidate_token(key):
+    """forget the cached snapshot of a token"""
+    tokens.delete(key)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+
+
+def invalidate_user(user_id):
+    """forget the cached snapshots of every token of a user"""
+    for key in Token.objects.filter(user_id=user_id).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """token authentication that skips the token query for known tokens
+
+    snapshots are kept per process for AUTH_TOKEN_CACHE_TTL seconds and,
+    when AUTH_TOKEN_SHARED_CACHE names a cache, shared between processes;
+    they hold the SNAPSHOT_FIELDS of the user but neither the token key
+    nor the password hash; deleting a token or saving its user drops them
+    """
+
+    def authenticate_credentials(self, key):
+        data = tokens.get(key)
+        if data is None:
+            shared = get_shared_cache()
+            if shared is not None:
+                data = shared.get(_shared_key(key))
+            if data is None:
+                user, token = super().authenticate_credentials(key)
+                data = snapshot(token)
+                if shared is not None:
+                    shared.set(_shared_key(key), data,
+                               settings.AUTH_TOKEN_SHARED_TTL)
+                tokens.set(key, data)
+                return user, token
+            tokens.set(key, data)
+        token = from_snapshot(key, data)
+        return token.user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """authenticate `Bearer <access token>` headers without the database
+
+    request.user is built from the token claims and carries only the
+    user id, enough to filter on; views that need the other fields have
+    to load the user, and it must never be saved
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                'Invalid bearer header. Provide exactly one token.'
+            )
+        try:
+            token = signed_tokens.verify_access_token(auth[1].decode())
+        except (UnicodeError, signed_tokens.InvalidToken) as error:
+            raise exceptions.AuthenticationFailed(str(error))
+        user = get_user_model()(pk=token.user_id, is_active=True)
+        user._state.adding = False
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
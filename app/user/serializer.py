@@ -38,6 +38,10 @@ class AuthTokenSerializer(serializers.Serializer):
         style={'input_type': 'password'},
         trim_whitespace=False
     )
+    token_type = serializers.ChoiceField(
+        choices=('opaque', 'signed'),
+        default='opaque'
+    )
 
     def validate(self, attrs):
         """Validate and authenticate the user"""
@@ -57,8 +61,6 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-
-
-
-
-
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for a refresh token sent back by the client"""
+    refresh = serializers.CharField(trim_whitespace=False)
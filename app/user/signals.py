@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, \
+    pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .tokens import revoke_user
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """stop accepting a deleted token from the cache"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_saved_user(sender, instance, created, **kwargs):
+    """drop the snapshots of a user whose password or status may change"""
+    if not created:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_credentials(sender, instance, **kwargs):
+    """remember the password and status to notice when a save changes them
+
+    None means a field was deferred and the sessions are left alone
+    """
+    fields = instance.get_deferred_fields()
+    if 'password' in fields or 'is_active' in fields:
+        instance._credentials = None
+    else:
+        instance._credentials = (instance.password, instance.is_active)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def revoke_sessions(sender, instance, created, **kwargs):
+    """end the signed token sessions of a user whose credentials changed"""
+    current = (instance.password, instance.is_active)
+    previous = getattr(instance, '_credentials', None)
+    instance._credentials = current
+    if not created and previous is not None and previous != current:
+        revoke_user(instance.pk)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_deleted_user_sessions(sender, instance, **kwargs):
+    """end the signed token sessions of a user about to be deleted
+
+    the sessions are kept without their user, so their access tokens
+    stay on the revocation list until they expire
+    """
+    revoke_user(instance.pk)
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import tokens
+
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """test token authentication served from the token cache"""
+
+    def setUp(self):
+        tokens.clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            name='kangogo',
+            password='passwordkangogo'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_skips_query(self):
+        """test a known token is authenticated without the token query"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """test a deleted token stops working at once"""
+        self.client.get(TAGS_URL)
+        self.token.delete()
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """test turning is_active off drops the cached user"""
+        self.client.get(TAGS_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_refreshes_user(self):
+        """test the cached user is reloaded after a password change"""
+        self.client.patch(ME_URL, {'name': 'sergon', 'password': 'newpass'})
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'sergon')
+
+    @override_settings(
+        AUTH_TOKEN_SHARED_CACHE='default',
+        AUTH_TOKEN_CACHE_TTL=0
+    )
+    def test_shared_cache(self):
+        """test processes share snapshots through the shared cache"""
+        caches['default'].clear()
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_SHARED_CACHE='default')
+    def test_shared_snapshot_has_no_secrets(self):
+        """test the shared cache holds neither the key nor the password"""
+        cache = caches['default']
+        cache.clear()
+        self.client.get(ME_URL)
+
+        data = b''.join(cache._cache.values())
+        self.assertNotIn(self.token.key.encode(), data)
+        self.assertNotIn(self.user.password.encode(), data)
+        self.assertIn(self.user.email.encode(), data)
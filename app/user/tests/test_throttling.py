@@ -0,0 +1,118 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.throttling import get_store, take
+
+TOKEN_URL = reverse('user:token')
+
+
+@override_settings(AUTH_THROTTLE_RATES={'login_ip': '5/min',
+                                        'login_email': '2/min'})
+class LoginThrottleTests(TestCase):
+    """test sign in attempts are throttled per email and per address"""
+
+    def setUp(self):
+        get_store().clear()
+        get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            password='password123'
+        )
+        self.client = APIClient()
+
+    def _sign_in(self, email='kangogo@baratel.com', password='wrong'):
+        return self.client.post(TOKEN_URL, {'email': email,
+                                            'password': password})
+
+    def test_rate_limit_headers(self):
+        """test responses report the tightest bucket"""
+        res = self._sign_in(password='password123')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-RateLimit-Limit'], '2')
+        self.assertEqual(res['X-RateLimit-Remaining'], '1')
+        self.assertEqual(res['X-RateLimit-Reset'], '30')
+
+    def test_email_throttled_before_hashing(self):
+        """test throttled attempts never reach authentication"""
+        self._sign_in()
+        self._sign_in()
+
+        with patch('user.serializer.authenticate') as authenticate:
+            res = self._sign_in(password='password123')
+
+        authenticate.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+        self.assertEqual(res['X-RateLimit-Remaining'], '0')
+
+    def test_email_bucket_ignores_case(self):
+        """test the email bucket is shared by every spelling"""
+        self._sign_in()
+        self._sign_in(email='KANGOGO@baratel.com')
+
+        res = self._sign_in(email=' Kangogo@Baratel.com')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_address_throttled(self):
+        """test one address cannot spread attempts over many emails"""
+        for index in range(5):
+            self._sign_in(email=f'user{index}@baratel.com')
+
+        res = self._sign_in(email='other@baratel.com')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_ignored(self):
+        """test a client cannot pick its address with X-Forwarded-For"""
+        for index in range(5):
+            self.client.post(TOKEN_URL, {
+                'email': f'user{index}@baratel.com', 'password': 'wrong'
+            }, HTTP_X_FORWARDED_FOR=f'10.0.0.{index}')
+
+        res = self.client.post(TOKEN_URL, {
+            'email': 'other@baratel.com', 'password': 'wrong'
+        }, HTTP_X_FORWARDED_FOR='10.0.0.99')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_forwarded_for_behind_proxy(self):
+        """test the address added by a trusted proxy identifies clients"""
+        for index in range(5):
+            self.client.post(TOKEN_URL, {
+                'email': f'user{index}@baratel.com', 'password': 'wrong'
+            }, HTTP_X_FORWARDED_FOR=f'10.0.0.{index}, 192.0.2.1')
+
+        res = self.client.post(TOKEN_URL, {
+            'email': 'other@baratel.com', 'password': 'wrong'
+        }, HTTP_X_FORWARDED_FOR='192.0.2.2')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(AUTH_THROTTLE_STORE='user.throttling.CacheBucketStore')
+    def test_cache_store(self):
+        """test buckets can live in a shared cache"""
+        get_store().clear()
+        self._sign_in()
+        self._sign_in()
+
+        res = self._sign_in()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_bucket_refills(self):
+        """test a bucket gains tokens back over time"""
+        state, allowed = take(None, 2, 1.0, 100.0)
+        state, allowed = take(state, 2, 1.0, 100.0)
+        self.assertEqual(state[0], 0)
+
+        state, allowed = take(state, 2, 1.0, 100.5)
+        self.assertFalse(allowed)
+        state, allowed = take(state, 2, 1.0, 101.0)
+        self.assertTrue(allowed)
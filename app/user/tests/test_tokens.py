@@ -0,0 +1,146 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.throttling import get_store
+from user.tokens import revoked
+
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class SignedTokenTests(TestCase):
+    """test signed access tokens and their refresh tokens"""
+
+    def setUp(self):
+        revoked.clear()
+        get_store().clear()
+        self.user = get_user_model().objects.create_user(
+            email='kangogo@baratel.com',
+            name='kangogo',
+            password='passwordkangogo'
+        )
+        self.client = APIClient()
+
+    def _login(self):
+        res = self.client.post(TOKEN_URL, {
+            'email': 'kangogo@baratel.com',
+            'password': 'passwordkangogo',
+            'token_type': 'signed',
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def _get(self, url, access):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_signed_token_issued(self):
+        """test signed mode returns an access and a refresh token"""
+        pair = self._login()
+
+        self.assertIn('access', pair)
+        self.assertIn('refresh', pair)
+        self.assertNotIn('token', pair)
+
+    def test_access_token_checked_without_queries(self):
+        """test an access token is verified without the database"""
+        access = self._login()['access']
+        self._get(TAGS_URL, access)
+
+        # the list itself is served from the list cache
+        with self.assertNumQueries(0):
+            res = self._get(TAGS_URL, access)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_manage_user_with_access_token(self):
+        """test the profile is loaded for a signed token user"""
+        res = self._get(ME_URL, self._login()['access'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_access_token(self):
+        """test a tampered access token is rejected"""
+        access = self._login()['access']
+
+        res = self._get(TAGS_URL, access[:-1] + 'x')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_ACCESS_TOKEN_TTL=-1)
+    def test_expired_access_token(self):
+        """test an access token is rejected after its lifetime"""
+        res = self._get(TAGS_URL, self._login()['access'])
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates(self):
+        """test a refresh token can be exchanged only once"""
+        pair = self._login()
+
+        res = self.client.post(REFRESH_URL, {'refresh': pair['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], pair['refresh'])
+
+        res = self.client.post(REFRESH_URL, {'refresh': pair['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._get(TAGS_URL, pair['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        """test revoking a session rejects its access tokens"""
+        pair = self._login()
+
+        res = self.client.post(REVOKE_URL, {'refresh': pair['refresh']})
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._get(TAGS_URL, pair['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_sessions(self):
+        """test changing the password ends the signed token sessions"""
+        pair = self._login()
+        self.user.set_password('newpassword')
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {'refresh': pair['refresh']})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_sessions_revoked(self):
+        """test the access tokens of a deleted user are rejected"""
+        access = self._login()['access']
+        self._get(TAGS_URL, access)
+
+        self.user.delete()
+
+        self.assertEqual(self._get(ME_URL, access).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(TAGS_URL, {'name': 'vegan'},
+                               HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_manage_deleted_user(self):
+        """test a missing user is an authentication failure, not a 500"""
+        access = self._login()['access']
+        self.user.delete()
+
+        # a process yet to reload its revocation list
+        with mock.patch('user.tokens.revoked', frozenset()):
+            res = self._get(ME_URL, access)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_malformed_refresh_token(self):
+        """test a refresh token that is not ours is rejected"""
+        res = self.client.post(REFRESH_URL, {'refresh': 'not-a-token'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -4,6 +4,8 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from user.throttling import get_store
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -17,6 +19,7 @@ class PublicUserApiTests(TestCase):
     """Test the user public apis"""
 
     def setUp(self):
+        get_store().clear()
         self.client = APIClient()
 
     def test_create_valid_user(self):
@@ -0,0 +1,164 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """return (capacity, refill per second) of a rate like '5/min'"""
+    count, _slash, period = rate.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def take(state, capacity, refill, now):
+    """take one token from a bucket
+
+    state is (tokens, updated) or None for a full bucket; returns the new
+    state and whether a token was available
+    """
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill)
+    if tokens < 1:
+        return (tokens, now), False
+    return (tokens - 1, now), True
+
+
+class LocalBucketStore:
+    """token buckets in process memory, bounded to the busiest keys"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._buckets = OrderedDict()
+
+    def consume(self, key, capacity, refill, now):
+        """take a token from the bucket of key, return (tokens, allowed)"""
+        with self._lock:
+            state, allowed = take(self._buckets.get(key), capacity, refill,
+                                  now)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > settings.AUTH_THROTTLE_LOCAL_SIZE:
+                self._buckets.popitem(last=False)
+        return state[0], allowed
+
+
+class CacheBucketStore:
+    """token buckets shared between processes through a django cache
+
+    the read and write are not atomic, so concurrent attempts on one key
+    may now and then both get the last token
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.AUTH_THROTTLE_CACHE]
+
+    def clear(self):
+        self.cache.clear()
+
+    def consume(self, key, capacity, refill, now):
+        """take a token from the bucket of key, return (tokens, allowed)"""
+        key = f'throttle:{key}'
+        state, allowed = take(self.cache.get(key), capacity, refill, now)
+        # a bucket left alone until it is full again needs no state
+        self.cache.set(key, state, int((capacity - state[0]) / refill) + 1)
+        return state[0], allowed
+
+
+_store = None
+_store_path = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """return the bucket store named by AUTH_THROTTLE_STORE"""
+    global _store, _store_path
+    with _store_lock:
+        if _store_path != settings.AUTH_THROTTLE_STORE:
+            _store = import_string(settings.AUTH_THROTTLE_STORE)()
+            _store_path = settings.AUTH_THROTTLE_STORE
+        return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """throttle requests with a token bucket per key
+
+    the bucket holds the number of requests of the scope's rate in
+    AUTH_THROTTLE_RATES and refills evenly over its period; the state of
+    every bucket checked is left on the request for the rate limit
+    headers
+    """
+    scope = None
+
+    def get_key(self, request, view):
+        """return the key of the bucket, or None to skip throttling"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        capacity, refill = parse_rate(
+            settings.AUTH_THROTTLE_RATES[self.scope]
+        )
+        tokens, allowed = get_store().consume(
+            f'{self.scope}:{key}', capacity, refill, time.time()
+        )
+        self.limit = capacity
+        self.remaining = int(tokens)
+        # seconds until the next token, and until the bucket is full
+        self._wait = max(0.0, (1 - tokens) / refill)
+        self.reset = (capacity - tokens) / refill
+        limits = getattr(request, 'rate_limits', [])
+        limits.append(self)
+        request.rate_limits = limits
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    """limit sign in attempts per client address"""
+    scope = 'login_ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class LoginEmailThrottle(TokenBucketThrottle):
+    """limit sign in attempts per account, whatever the address"""
+    scope = 'login_email'
+
+    def get_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        return email.strip().lower()
+
+
+class RateLimitHeadersMixin:
+    """add X-RateLimit headers of the tightest throttle to responses"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        limits = getattr(request, 'rate_limits', None)
+        if limits:
+            tightest = min(limits, key=lambda throttle: throttle.remaining)
+            response['X-RateLimit-Limit'] = str(tightest.limit)
+            response['X-RateLimit-Remaining'] = str(tightest.remaining)
+            response['X-RateLimit-Reset'] = str(math.ceil(tightest.reset))
+        return response
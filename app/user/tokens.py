@@ -0,0 +1,179 @@
+import hashlib
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import RefreshToken
+
+ACCESS_SALT = 'user.tokens.access'
+
+
+class InvalidToken(Exception):
+    """a token that is malformed, expired or revoked"""
+
+
+class AccessToken:
+    """the verified claims of a signed access token"""
+
+    def __init__(self, user_id, session_id):
+        self.user_id = user_id
+        self.session_id = session_id
+
+
+class RevocationList:
+    """ids of the sessions revoked while their access tokens may live
+
+    the list is read from the refresh tokens revoked within the access
+    token lifetime, and reloaded at most every AUTH_REVOCATION_REFRESH
+    seconds so verifying an access token stays in memory
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+            self._ids = frozenset()
+
+    def _load(self):
+        since = timezone.now() - timedelta(
+            seconds=settings.AUTH_ACCESS_TOKEN_TTL
+        )
+        return frozenset(str(pk) for pk in RefreshToken.objects.filter(
+            revoked_at__gt=since
+        ).values_list('id', flat=True))
+
+    def __contains__(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            fresh = (self._loaded_at is not None and
+                     now - self._loaded_at < settings.AUTH_REVOCATION_REFRESH)
+            if fresh:
+                return session_id in self._ids
+        ids = self._load()
+        with self._lock:
+            self._ids, self._loaded_at = ids, now
+        return session_id in ids
+
+
+revoked = RevocationList()
+
+
+def _hash(secret):
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _parse_refresh(value):
+    """split a refresh token into its session id and secret"""
+    session_id, _dot, secret = str(value).partition('.')
+    try:
+        session_id = RefreshToken._meta.pk.to_python(session_id)
+    except ValidationError:
+        secret = ''
+    if not secret:
+        raise InvalidToken('Malformed refresh token.')
+    return session_id, secret
+
+
+def access_token(user_id, session_id):
+    """return a signed access token for a session of a user"""
+    return signing.dumps({'uid': user_id, 'sid': str(session_id)},
+                         salt=ACCESS_SALT)
+
+
+def verify_access_token(value):
+    """return the AccessToken of a signed value without touching the db"""
+    try:
+        claims = signing.loads(value, salt=ACCESS_SALT,
+                               max_age=settings.AUTH_ACCESS_TOKEN_TTL)
+    except signing.SignatureExpired:
+        raise InvalidToken('Access token expired.')
+    except signing.BadSignature:
+        raise InvalidToken('Invalid access token.')
+    if claims['sid'] in revoked:
+        raise InvalidToken('Access token revoked.')
+    return AccessToken(claims['uid'], claims['sid'])
+
+
+def _pair(session, secret):
+    return {
+        'access': access_token(session.user_id, session.pk),
+        'refresh': f'{session.pk}.{secret}',
+        'expires_in': settings.AUTH_ACCESS_TOKEN_TTL,
+    }
+
+
+def issue(user):
+    """start a session for user and return its access and refresh tokens"""
+    secret = secrets.token_urlsafe(32)
+    session = RefreshToken.objects.create(
+        user=user,
+        secret_hash=_hash(secret),
+        expires_at=timezone.now() + timedelta(
+            seconds=settings.AUTH_REFRESH_TOKEN_TTL
+        ),
+    )
+    return _pair(session, secret)
+
+
+def rotate(value):
+    """exchange a refresh token for a new pair
+
+    presenting a secret that was already exchanged revokes the session,
+    as the token must have been copied
+    """
+    session_id, secret = _parse_refresh(value)
+    now = timezone.now()
+    with transaction.atomic():
+        session = RefreshToken.objects.select_for_update().select_related(
+            'user'
+        ).filter(pk=session_id).first()
+        if session is None or session.revoked_at is not None:
+            raise InvalidToken('Invalid refresh token.')
+        reused = not secrets.compare_digest(session.secret_hash,
+                                            _hash(secret))
+        if reused:
+            # committed before raising so the revocation sticks
+            session.revoked_at = now
+            session.save(update_fields=['revoked_at'])
+        elif session.expires_at <= now or not session.user.is_active:
+            raise InvalidToken('Refresh token expired.')
+        else:
+            secret = secrets.token_urlsafe(32)
+            session.secret_hash = _hash(secret)
+            session.expires_at = now + timedelta(
+                seconds=settings.AUTH_REFRESH_TOKEN_TTL
+            )
+            session.save(update_fields=['secret_hash', 'expires_at'])
+    if reused:
+        revoked.clear()
+        raise InvalidToken('Refresh token reused.')
+    return _pair(session, secret)
+
+
+def revoke(value):
+    """end the session of a refresh token"""
+    session_id, secret = _parse_refresh(value)
+    updated = RefreshToken.objects.filter(
+        pk=session_id, secret_hash=_hash(secret), revoked_at__isnull=True
+    ).update(revoked_at=timezone.now())
+    if not updated:
+        raise InvalidToken('Invalid refresh token.')
+    revoked.clear()
+
+
+def revoke_user(user_id):
+    """end every session of a user"""
+    if RefreshToken.objects.filter(
+        user_id=user_id, revoked_at__isnull=True
+    ).update(revoked_at=timezone.now()):
+        revoked.clear()
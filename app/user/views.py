@@ -1,10 +1,19 @@
-
-from rest_framework import generics,authentication,permissions
+from django.contrib.auth import get_user_model
+from rest_framework import exceptions,generics,permissions,status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from rest_framework.settings import api_settings
 
-from . serializer import UserSerializer,AuthTokenSerializer
+from . import tokens
+from . authentication import CachedTokenAuthentication, \
+    SignedTokenAuthentication
+from . throttling import LoginEmailThrottle, LoginIPThrottle, \
+    RateLimitHeadersMixin
+from . serializer import UserSerializer,AuthTokenSerializer, \
+    RefreshTokenSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -12,18 +21,80 @@ class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
-    """create token for user"""
+class CreateTokenView(RateLimitHeadersMixin, ObtainAuthToken):
+    """create token for user
+
+    `token_type=signed` returns a short lived signed access token and a
+    refresh token instead of the database backed token; attempts are
+    throttled before the password is ever hashed
+    """
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        if serializer.validated_data['token_type'] == 'signed':
+            return Response(tokens.issue(user))
+        token, _created = Token.objects.get_or_create(user=user)
+        return Response({'token': token.key})
+
+
+class RefreshTokenBaseView(APIView):
+    """base view for the endpoints taking a refresh token
+
+    they run unauthenticated so that an expired access token sent along
+    does not get in the way
+    """
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get_authenticate_header(self, request):
+        return SignedTokenAuthentication.keyword
+
+    def apply(self, request, func):
+        """call func with the posted refresh token"""
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            return func(serializer.validated_data['refresh'])
+        except tokens.InvalidToken as error:
+            raise exceptions.AuthenticationFailed(str(error))
+
+
+class RefreshTokenView(RefreshTokenBaseView):
+    """exchange a refresh token for a new access and refresh token"""
+
+    def post(self, request):
+        return Response(self.apply(request, tokens.rotate))
+
+
+class RevokeTokenView(RefreshTokenBaseView):
+    """end the session of a refresh token and its access tokens"""
+
+    def post(self, request):
+        self.apply(request, tokens.revoke)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         """retrieve and return authenticated users"""
+        signed = isinstance(self.request.auth, tokens.AccessToken)
+        if signed or self.request.method not in permissions.SAFE_METHODS:
+            # signed tokens only carry the user id, and cached token users
+            # only the fields of their snapshot
+            try:
+                return get_user_model().objects.get(pk=self.request.user.pk)
+            except get_user_model().DoesNotExist:
+                raise exceptions.AuthenticationFailed('User not found.')
         return self.request.user